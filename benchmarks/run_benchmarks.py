@@ -0,0 +1,167 @@
+"""分阶段的性能基准，结果写成 JSON，便于比较不同版本
+
+用法::
+
+    OSUPP_BUILD_DIR=path/to/osu-tools/PerformanceCalculator/bin/Release/net8.0 python benchmarks/run_benchmarks.py -o result.json
+    python benchmarks/run_benchmarks.py -o new.json --compare result.json
+
+每个阶段单独计时，前一阶段的产物在计时之外准备好，只测量该阶段本身
+"""
+
+import argparse
+import os
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+import orjson
+
+from osupp.core import init_osu_tools
+
+BEATMAP_DIR = Path(__file__).resolve().parent.parent / "tests"
+
+# (名称, 模式, 谱面, 模组)，taiko、catch 和 mania 都有短谱和长谱，长谱没有原生谱面时使用 3477131 的转谱
+# osu! 目前只有一张可用的谱面（4429119 是 osu-tools 无法处理的特殊谱面，见 test_strange），因此只测长谱
+CASES = [
+    ("osu-long", 0, "3477131.osu", []),
+    ("osu-long-hddt", 0, "3477131.osu", ["HD", "DT"]),
+    ("taiko-short", 1, "4434797.osu", []),
+    ("taiko-long", 1, "3477131.osu", []),
+    ("catch-short", 2, "2158794.osu", ["NF", "CL"]),
+    ("catch-long", 2, "3477131.osu", []),
+    ("mania-short", 3, "4103079.osu", []),
+    ("mania-long", 3, "767046.osu", ["CL"]),
+]
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> dict[str, float]:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    return {"repeat": repeat, "min_ms": min(samples), "median_ms": statistics.median(samples), "mean_ms": statistics.fmean(samples)}
+
+
+def default_performance(ruleset_id: int):
+    from osupp.performance import CatchPerformance, ManiaPerformance, OsuPerformance, TaikoPerformance
+
+    return [OsuPerformance(accuracy_percent=98.0, misses=1), TaikoPerformance(accuracy_percent=98.0, misses=1), CatchPerformance(accuracy_percent=98.0, misses=1), ManiaPerformance(accuracy_percent=98.0, misses=1)][ruleset_id]
+
+
+def run_case(name: str, ruleset_id: int, beatmap_path: str, mods: list[str], repeat: int) -> list[dict]:
+    from osupp.core import Array, ProcessorCommand, ProcessorWorkingBeatmap
+    from osupp.performance import ScoreCalculator, calculate_performance, generate_hit_result, summarize_beatmap
+    from osupp.pipeline import calculate_with_skills, collect_strain_timelines, get_playable_beatmap
+    from osupp.registry import get_ruleset
+    from osupp.util import re_deserialize
+
+    ruleset = get_ruleset(ruleset_id)
+    working_beatmap = ProcessorWorkingBeatmap(beatmap_path)
+    mod_array = ProcessorCommand.ParseMods(ruleset, Array[str](mods), Array[str]([]))
+    beatmap = get_playable_beatmap(working_beatmap, ruleset, mod_array)
+    calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
+    difficulty_attributes = calculator.Calculate(mod_array)
+    summary = summarize_beatmap(beatmap, ruleset_id)
+    perf = default_performance(ruleset_id)
+    score_calculator = ScoreCalculator(ruleset, working_beatmap.BeatmapInfo, mod_array)
+
+    def performance_first(strain_timeline: bool):
+        calculator = calculate_performance(beatmap_path, ruleset, mods, strain_timeline=strain_timeline)
+        next(calculator)
+        calculator.close()
+
+    def strain_timeline():
+        difficulty_pass = calculate_with_skills(ruleset.CreateDifficultyCalculator(working_beatmap), get_playable_beatmap(working_beatmap, ruleset, mod_array), mod_array)
+        return collect_strain_timelines(difficulty_pass)
+
+    stages = {
+        "parse": lambda: ProcessorWorkingBeatmap(beatmap_path),
+        "parse_mods": lambda: ProcessorCommand.ParseMods(ruleset, Array[str](mods), Array[str]([])),
+        "playable_beatmap": lambda: get_playable_beatmap(working_beatmap, ruleset, mod_array),
+        "difficulty": lambda: calculator.Calculate(mod_array),
+        # Python 侧逐个物件驱动 skill，与上面的 Calculate 对比即为打开 strain timeline 的额外跨边界开销
+        "difficulty_skills": lambda: calculate_with_skills(ruleset.CreateDifficultyCalculator(working_beatmap), beatmap, mod_array),
+        "strain_timeline": strain_timeline,
+        "summarize": lambda: summarize_beatmap(beatmap, ruleset_id),
+        "hit_results": lambda: generate_hit_result(perf, beatmap, mod_array, summary),
+        "performance": lambda: score_calculator.calculate(perf, beatmap, summary, difficulty_attributes),
+        "re_deserialize": lambda: re_deserialize(difficulty_attributes),
+        # 生成器第一次返回难度属性的完整耗时，分别关闭和打开 strain timeline
+        "timeline_off": lambda: performance_first(False),
+        "timeline_on": lambda: performance_first(True),
+    }
+    results = []
+    for stage, func in stages.items():
+        results.append({"case": name, "ruleset_id": ruleset_id, "beatmap": Path(beatmap_path).name, "mods": mods, "stage": stage, **measure(func, repeat)})
+        print(f"{name:<16} {stage:<16} {results[-1]['median_ms']:10.3f} ms", file=sys.stderr)
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict]):
+    base = {(r["case"], r["stage"]): r["median_ms"] for r in baseline}
+    for r in results:
+        old = base.get((r["case"], r["stage"]))
+        if old:
+            print(f"{r['case']:<16} {r['stage']:<16} {old:10.3f} -> {r['median_ms']:10.3f} ms ({r['median_ms'] / old:6.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="osupp stage benchmarks")
+    parser.add_argument("--build-dir", default=os.environ.get("OSUPP_BUILD_DIR"), help="osu-tools PerformanceCalculator build directory, defaults to $OSUPP_BUILD_DIR")
+    parser.add_argument("--beatmap-dir", default=str(BEATMAP_DIR))
+    parser.add_argument("-n", "--repeat", type=int, default=10)
+    parser.add_argument("-k", "--case", action="append", help="only run cases whose name contains this string, may be repeated")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON produced by a previous run")
+    args = parser.parse_args()
+    if not args.build_dir:
+        parser.error("--build-dir or OSUPP_BUILD_DIR is required")
+
+    start = time.perf_counter()
+    init_osu_tools(args.build_dir)
+    init_ms = (time.perf_counter() - start) * 1000
+
+    from osupp.core import startup_report
+    from osupp.registry import get_ruleset
+    from osupp.store import get_osu_version
+
+    results = []
+    for name, ruleset_id, beatmap, mods in CASES:
+        if args.case and not any(k in name for k in args.case):
+            continue
+        try:
+            results.extend(run_case(name, ruleset_id, str(Path(args.beatmap_dir) / beatmap), mods, args.repeat))
+        except Exception as e:
+            # 单个谱面无法计算时跳过，不影响其他用例
+            print(f"{name:<16} skipped: {type(e).__name__}: {e}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "osu_version": get_osu_version(get_ruleset(0)),
+            "init_ms": init_ms,
+            "startup": startup_report(),
+        },
+        "results": results,
+    }
+    data = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.output:
+        Path(args.output).write_bytes(data)
+    else:
+        sys.stdout.buffer.write(data + b"\n")
+
+    if args.compare:
+        compare(results, orjson.loads(Path(args.compare).read_bytes())["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import os
+
 from osupp.core import init_osu_tools
 
-init_osu_tools(r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0")
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
 
 import System
 from System.Reflection import Assembly
@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Literal, Optional
+
+from .batch import BatchJob, execute_job
+from .core import CancellationTokenSource
+from .registry import mod_set_key
+from .util import Result
+
+logger = logging.getLogger(__name__)
+
+
+class _InFlight:
+    __slots__ = ("task", "token_source", "waiters", "started")
+
+    def __init__(self, task: asyncio.Task, token_source):
+        self.task = task
+        self.token_source = token_source
+        self.waiters = 0
+        self.started = False
+
+
+def _job_key(job: BatchJob) -> tuple:
+    # 与 registry 的模组缓存一样按排序后的模组合并，书写顺序不同的相同请求共享一次计算
+    return (
+        job.beatmap_path,
+        mod_set_key(job.ruleset_id, job.mods, job.mod_options),
+        tuple(job.performances) if job.performances is not None else None,
+    )
+
+
+class AsyncCalculator:
+    """供 asyncio 程序使用的计算入口，所有 .NET 调用都在专用的 executor 中执行，不会阻塞事件循环
+
+    默认使用单线程 executor，所有计算串行执行；``max_pending`` 为排队和执行中的任务数上限，
+    新的请求在创建任务之前先占用一个名额，名额用完时调用方会在 ``await`` 处等待，形成背压
+
+    参数完全相同的请求在执行期间只会计算一次，结果由所有等待者共享
+
+    ``timeout`` 只影响当前等待者，超时抛出 ``TimeoutError``；当一个任务的所有等待者都已超时或取消时，
+    会通过 ``CancellationToken`` 取消正在执行的计算
+    """
+
+    def __init__(self, max_pending: int = 64, executor: Optional[Executor] = None):
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor(1, thread_name_prefix="osupp")
+        self._semaphore = asyncio.Semaphore(max_pending)
+        self._in_flight: dict[tuple, _InFlight] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for entry in self._in_flight.values():
+            entry.token_source.Cancel()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _execute(self, job: BatchJob, entry: _InFlight) -> tuple[Result, Optional[list[Result]]]:
+        entry.started = True
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(execute_job, job, entry.token_source.Token))
+
+    def _forget(self, key: tuple, entry: _InFlight, task: asyncio.Task):
+        self._semaphore.release()
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+        entry.token_source.Dispose()
+        # 所有等待者都已离开时没有人读取结果，在这里取出异常，避免 "Task exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None and entry.waiters == 0:
+            logger.debug("calculation finished with no waiters left", exc_info=task.exception())
+
+    async def run(self, job: BatchJob, timeout: Optional[float] = None) -> tuple[Result, Optional[list[Result]]]:
+        key = _job_key(job)
+        entry = self._in_flight.get(key)
+        if entry is None:
+            # 先占用名额再创建任务，名额用完时在这里等待
+            await self._semaphore.acquire()
+            entry = self._in_flight.get(key)
+            if entry is not None:
+                # 等待期间已有相同的请求创建了任务，直接共享
+                self._semaphore.release()
+            else:
+                entry = _InFlight(None, CancellationTokenSource())
+                entry.task = asyncio.ensure_future(self._execute(job, entry))
+                entry.task.add_done_callback(functools.partial(self._forget, key, entry))
+                self._in_flight[key] = entry
+
+        entry.waiters += 1
+        try:
+            # shield 保证单个等待者超时或取消时不会影响共享的任务
+            return await asyncio.wait_for(asyncio.shield(entry.task), timeout)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                # 没有等待者了，之后相同的请求重新计算
+                if self._in_flight.get(key) is entry:
+                    del self._in_flight[key]
+                if entry.started:
+                    # 已经在 executor 中执行，只能协作取消，executor 线程会在检查 token 时退出
+                    entry.token_source.Cancel()
+                else:
+                    entry.task.cancel()
+
+    async def calculate_difficulty(
+        self,
+        beatmap_path: str,
+        mods: Optional[list[str]] = None,
+        mod_options: Optional[list[str]] = None,
+        ruleset_id: Optional[Literal[0, 1, 2, 3]] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> Result:
+        difficulty, _ = await self.run(BatchJob(beatmap_path, ruleset_id, mods, mod_options), timeout)
+        return difficulty
+
+    async def calculate_performance(
+        self,
+        beatmap_path: str,
+        performances: list[Any],
+        mods: Optional[list[str]] = None,
+        mod_options: Optional[list[str]] = None,
+        ruleset_id: Optional[Literal[0, 1, 2, 3]] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> tuple[Result, list[Result]]:
+        """返回 (``difficulty_attributes``, ``performance_attributes`` 列表)，模式默认由 ``performances`` 的类型决定"""
+        return await self.run(BatchJob(beatmap_path, ruleset_id, mods, mod_options, list(performances)), timeout)
@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import pickle
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Literal, NamedTuple, Optional
+
+from .config import get_config, pinned_config, set_config
+from .core import init_osu_tools
+from .instrument import count, current_collectors, finish_call, start_call, use_collectors
+
+
+class BatchJob(NamedTuple):
+    beatmap_path: str
+    ruleset_id: Optional[Literal[0, 1, 2, 3]] = None
+    mods: Optional[list[str]] = None
+    mod_options: Optional[list[str]] = None
+    # 为 None 时只计算难度，否则依次计算其中每个 OsuPerformance / TaikoPerformance / CatchPerformance / ManiaPerformance
+    performances: Optional[list[Any]] = None
+
+
+class BatchResult(NamedTuple):
+    job: BatchJob
+    difficulty: Optional[dict] = None
+    performances: Optional[list[dict]] = None
+    error: Optional[str] = None
+
+
+def _init_worker(build_dir: str, config: dict):
+    init_osu_tools(build_dir)
+    set_config(**config)
+
+
+def _picklable_config(config: dict) -> dict:
+    """spawn 的 worker 只能接收可以 pickle 的配置，例如 lambda 形式的 ``metrics_hook`` 会被丢弃"""
+    result = {}
+    for k, v in config.items():
+        try:
+            pickle.dumps(v)
+        except Exception:
+            continue
+        result[k] = v
+    return result
+
+
+def _performance_ruleset_id(job: BatchJob) -> Optional[int]:
+    """由 ``ruleset_id`` 或第一个成绩的类型决定模式，无法决定时返回 ``None``，此时使用谱面自身的模式"""
+    from .performance import CatchPerformance, ManiaPerformance, OsuPerformance, TaikoPerformance
+
+    if job.ruleset_id is not None:
+        return job.ruleset_id
+    if not job.performances:
+        return None
+    match job.performances[0]:
+        case OsuPerformance():
+            return 0
+        case TaikoPerformance():
+            return 1
+        case CatchPerformance():
+            return 2
+        case ManiaPerformance():
+            return 3
+        case _:
+            return None
+
+
+def execute_job(job: BatchJob, cancellation_token=None) -> tuple[dict, Optional[list[dict]]]:
+    """在当前进程中执行一个任务，返回 (difficulty, performances)，异常直接抛出"""
+    # 这些模块依赖已初始化的 .NET 运行时，只能在调用时导入
+    from .cache import get_working_beatmap
+    from .difficulty import calculate_difficulty
+    from .performance import calculate_performance
+    from .registry import get_ruleset
+
+    if job.performances is None:
+        return calculate_difficulty(job.beatmap_path, job.mods, job.mod_options, job.ruleset_id, cancellation_token=cancellation_token), None
+
+    ruleset_id = _performance_ruleset_id(job)
+    if ruleset_id is None:
+        ruleset_id = get_working_beatmap(job.beatmap_path).BeatmapInfo.Ruleset.OnlineID
+    ruleset = get_ruleset(ruleset_id)
+    calculator = calculate_performance(job.beatmap_path, ruleset, job.mods, job.mod_options, cancellation_token=cancellation_token)
+    # 拒绝和取消时生成器同样会产出标记结果，第一次 next() 总能拿到难度
+    difficulty = next(calculator)
+    performances = calculator.send(list(job.performances)) if job.performances else []
+    calculator.close()
+    return difficulty, performances
+
+
+def _run_job(args: tuple[BatchJob, Optional[float]]) -> BatchResult:
+    job, timeout = args
+    # 整个任务作为一次调用统计，内部的难度和 performance 计算另外各自统计
+    metrics = start_call("batch_job", job.beatmap_path)
+    try:
+        result = _execute_with_timeout(job, timeout)
+        if result.error is not None:
+            count(metrics, "timeouts" if result.error == "timeout" else "errors")
+        elif result.performances is not None:
+            count(metrics, "scores", len(result.performances))
+        return result
+    finally:
+        finish_call(metrics)
+
+
+def _execute_with_timeout(job: BatchJob, timeout: Optional[float]) -> BatchResult:
+    from .core import CancellationTokenSource, OperationCanceledException, TimeSpan
+
+    # 不限时的时候不传 token，保留 osu! 谱面转换自带的默认超时
+    token_source = CancellationTokenSource(TimeSpan.FromSeconds(timeout)) if timeout is not None else None
+    token = token_source.Token if token_source is not None else None
+    try:
+        difficulty, performances = execute_job(job, token)
+    except OperationCanceledException:
+        return BatchResult(job, error="timeout")
+    except Exception as e:
+        return BatchResult(job, error=f"{type(e).__name__}: {e}")
+    finally:
+        if token_source is not None:
+            token_source.Dispose()
+
+    # 只有计算真正被取消（结果带有取消标记）时才算超时，已经算完的任务即使随后到时也保留结果
+    if difficulty.get("__ek_cancelled"):
+        return BatchResult(job, error="timeout")
+    return BatchResult(job, difficulty, performances)
+
+
+def run_batch(
+    build_dir: str,
+    jobs: Iterable[BatchJob],
+    processes: Optional[int] = None,
+    chunksize: int = 1,
+    ordered: bool = True,
+    timeout: Optional[float] = None,
+    maxtasksperchild: Optional[int] = None,
+) -> Iterator[BatchResult]:
+    """在多个 worker 进程中并行计算，每个进程只调用一次 ``init_osu_tools``
+
+    worker 内部直接调用 ``calculate_difficulty`` / ``calculate_performance``，结果与单进程计算完全一致，
+    但不包含 strain timeline
+
+    ``ordered`` 为 ``False`` 时按完成顺序返回结果，可以通过 ``BatchResult.job`` 对应回任务
+
+    ``timeout`` 为单个任务的秒数上限，通过 ``CancellationToken`` 协作取消，超时或出错的任务只会记录 ``error``，不影响其他任务
+
+    worker 进程中只有可以 pickle 的 ``metrics_hook`` （例如模块级函数）会在 worker 中被调用，``collect_metrics`` 无法跨进程收集
+    """
+    if processes is None:
+        processes = os.cpu_count()
+    # CoreCLR 无法在 fork 出的子进程中继续使用，必须使用 spawn
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes, initializer=_init_worker, initargs=(build_dir, _picklable_config(get_config())), maxtasksperchild=maxtasksperchild) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(_run_job, ((job, timeout) for job in jobs), chunksize)
+
+
+def _run_job_pinned(config: dict, collectors: list, args: tuple[BatchJob, Optional[float]]) -> BatchResult:
+    with pinned_config(config), use_collectors(collectors):
+        return _run_job(args)
+
+
+def run_batch_threaded(
+    jobs: Iterable[BatchJob],
+    threads: Optional[int] = None,
+    ordered: bool = True,
+    timeout: Optional[float] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[BatchResult]:
+    """在当前进程的多个线程中并行计算，共享已经初始化的运行时、谱面缓存和难度存储，不需要每个进程重新启动运行时
+
+    pythonnet 在调用 .NET 方法时会释放 GIL，因此计算本身可以并行；每个线程使用自己的 ruleset 单例和模组缓存，每个任务都会创建自己的计算器，
+    并固定提交时的配置快照，计算期间调用 ``set_config`` 不会影响已提交的任务
+
+    ``jobs`` 按需读取，同时提交的任务最多 ``max_pending`` 个（默认为线程数的两倍），可以直接传入很大的生成器
+
+    各线程中的统计会交给提交时的 ``metrics_hook`` 和调用线程的 ``collect_metrics``，按完成顺序出现
+
+    其余参数与 ``run_batch`` 相同，必须先调用 ``init_osu_tools``
+    """
+    config = get_config()
+    collectors = current_collectors()
+    threads = threads if threads is not None else os.cpu_count()
+    max_pending = max_pending if max_pending is not None else 2 * threads
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(threads, thread_name_prefix="osupp") as executor:
+        pending: deque[Future] | set[Future] = deque() if ordered else set()
+        add = pending.append if ordered else pending.add
+        for job in islice(jobs, max_pending):
+            add(executor.submit(_run_job_pinned, config, collectors, (job, timeout)))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                add = pending.add
+            for future in done:
+                result = future.result()
+                # 每取出一个结果补充一个任务，保持窗口大小
+                for job in islice(jobs, 1):
+                    add(executor.submit(_run_job_pinned, config, collectors, (job, timeout)))
+                yield result
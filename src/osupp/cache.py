@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .config import current_config
+from .core import ProcessorWorkingBeatmap
+from .util import beatmap_md5
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    maxbytes: int
+    currbytes: int
+
+
+class BeatmapCache:
+    """``ProcessorWorkingBeatmap`` 的 LRU 缓存
+
+    键由 ``beatmap_cache_key`` 配置决定，文件被修改后会自然失效，旧条目随 LRU 淘汰
+
+    可以在多个线程中共享，谱面解析在锁外进行，不同谱面可以并行解析
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[ProcessorWorkingBeatmap, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(beatmap_path: str) -> tuple:
+        stat = os.stat(beatmap_path)
+        if current_config()["beatmap_cache_key"] == "md5":
+            return "md5", beatmap_md5(beatmap_path), stat.st_size
+        return "mtime", os.path.abspath(beatmap_path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, beatmap_path: str) -> ProcessorWorkingBeatmap:
+        maxsize = current_config()["beatmap_cache_maxsize"]
+        maxbytes = current_config()["beatmap_cache_maxbytes"]
+        if not maxsize or not maxbytes:
+            with self._lock:
+                self.misses += 1
+            return ProcessorWorkingBeatmap(beatmap_path)
+
+        key = self.make_key(beatmap_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        working_beatmap = ProcessorWorkingBeatmap(beatmap_path)
+        size = key[-1]
+        with self._lock:
+            # 其它线程可能同时解析了同一个谱面，以先放入的为准
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            self._entries[key] = (working_beatmap, size)
+            self._bytes += size
+            self._evict(maxsize, maxbytes)
+        return working_beatmap
+
+    def _evict(self, maxsize: int, maxbytes: int):
+        # 至少保留刚放入的条目，单个超大谱面也能被复用
+        while len(self._entries) > 1 and (len(self._entries) > maxsize or self._bytes > maxbytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, current_config()["beatmap_cache_maxsize"], len(self._entries), current_config()["beatmap_cache_maxbytes"], self._bytes)
+
+
+_BEATMAP_CACHE = BeatmapCache()
+
+
+def get_working_beatmap(beatmap_path: str) -> ProcessorWorkingBeatmap:
+    """从共享缓存中取出谱面，未命中时解析并放入缓存"""
+    return _BEATMAP_CACHE.get(beatmap_path)
+
+
+def beatmap_cache_info() -> CacheInfo:
+    return _BEATMAP_CACHE.info()
+
+
+def clear_beatmap_cache():
+    _BEATMAP_CACHE.clear()
@@ -1,15 +1,82 @@
+import threading
+from contextlib import contextmanager
+
 _CONFIG = {
     "strain_timeline": True,
+    # 为 True 时 strain timeline 以 (time, strain) 元组列表返回，否则为两个 float64 数组
+    "strain_timeline_as_tuples": False,
+    # 谱面缓存，maxsize 为条目数上限，maxbytes 为按 .osu 文件大小累计的上限，任一设为 0 即关闭缓存
+    "beatmap_cache_maxsize": 128,
+    "beatmap_cache_maxbytes": 64 * 1024 * 1024,
+    # 缓存键的计算方式，"mtime" 使用路径 + 修改时间 + 文件大小，"md5" 使用文件内容的 MD5
+    "beatmap_cache_key": "mtime",
+    # 难度属性持久化存储的 SQLite 文件路径，None 表示不启用
+    "difficulty_store": None,
+    # 对属性均为基本类型的 .NET 对象直接按 Newtonsoft 的契约读取属性，否则回退到 JSON 序列化
+    "fast_deserialize": True,
+    # 解析谱面前的预检查，超出限制的谱面直接拒绝，None 表示不限制
+    # max_slider_length 按滑条的像素长度乘以往返次数计算
+    "max_hit_objects": None,
+    "max_slider_length": None,
+    # 每次计算调用结束时以 osupp.instrument.CallMetrics 调用的函数，None 表示不统计
+    "metrics_hook": None,
 }
 
 
+_CONFIG_LOCK = threading.Lock()
+# 每个线程正在进行的计算所固定的配置快照
+_LOCAL = threading.local()
+
+
 def set_config(**kwargs):
     global _CONFIG
-    for key, value in kwargs.items():
-        _CONFIG[key] = value
+    with _CONFIG_LOCK:
+        _CONFIG.update(kwargs)
 
 
 def get_config(key=None):
     if key is None:
-        return _CONFIG.copy()
+        with _CONFIG_LOCK:
+            return _CONFIG.copy()
     return _CONFIG.get(key)
+
+
+def current_config() -> dict:
+    """计算过程中读取配置的入口，当前线程固定了快照时返回快照，否则返回全局配置"""
+    return getattr(_LOCAL, "config", None) or _CONFIG
+
+
+@contextmanager
+def pinned_config(config: dict = None):
+    """在当前线程内固定一份配置快照，期间其它线程调用 ``set_config`` 不会影响本次计算
+
+    已经固定过快照时（嵌套调用）直接沿用外层的快照
+    """
+    previous = getattr(_LOCAL, "config", None)
+    if previous is not None and config is None:
+        yield previous
+        return
+    _LOCAL.config = config if config is not None else get_config()
+    try:
+        yield _LOCAL.config
+    finally:
+        _LOCAL.config = previous
+
+
+def pin_config_generator(generator):
+    """在调用时固定配置快照，之后生成器的每一步都在该快照下执行，即使在不同线程中驱动也是如此"""
+    return _drive_pinned(generator, current_config().copy())
+
+
+def _drive_pinned(generator, config: dict):
+    sent = None
+    try:
+        while True:
+            with pinned_config(config):
+                try:
+                    value = generator.send(sent)
+                except StopIteration as e:
+                    return e.value
+            sent = yield value
+    finally:
+        generator.close()
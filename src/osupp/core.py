@@ -1,5 +1,10 @@
+import importlib
 import os
 import sys
+import threading
+import time
+from collections.abc import Iterable
+from typing import Optional
 
 from clr_loader import get_coreclr
 from pythonnet import set_runtime
@@ -7,29 +12,109 @@ from pythonnet import set_runtime
 # 内部状态变量，记录是否已加载
 _runtime_initialized = False
 _dotnet_libs_imported = False
+# 各模式的程序集和类型在第一次使用时才加载，(程序集, {类型名: 命名空间})
+_RULESET_TYPES = {
+    "osu": (
+        "osu.Game.Rulesets.Osu",
+        {
+            "OsuRuleset": "osu.Game.Rulesets.Osu",
+            "OsuDifficultyAttributes": "osu.Game.Rulesets.Osu.Difficulty",
+            "OsuPerformanceAttributes": "osu.Game.Rulesets.Osu.Difficulty",
+            "Aim": "osu.Game.Rulesets.Osu.Difficulty.Skills",
+            "Speed": "osu.Game.Rulesets.Osu.Difficulty.Skills",
+            "OsuModClassic": "osu.Game.Rulesets.Osu.Mods",
+            "Slider": "osu.Game.Rulesets.Osu.Objects",
+            "SliderTick": "osu.Game.Rulesets.Osu.Objects",
+            "SliderRepeat": "osu.Game.Rulesets.Osu.Objects",
+            "OsuDifficultyHitObject": "osu.Game.Rulesets.Osu.Difficulty.Preprocessing",
+        },
+    ),
+    "taiko": (
+        "osu.Game.Rulesets.Taiko",
+        {
+            "TaikoRuleset": "osu.Game.Rulesets.Taiko",
+        },
+    ),
+    "catch": (
+        "osu.Game.Rulesets.Catch",
+        {
+            "CatchRuleset": "osu.Game.Rulesets.Catch",
+            "Droplet": "osu.Game.Rulesets.Catch.Objects",
+            "TinyDroplet": "osu.Game.Rulesets.Catch.Objects",
+            "Fruit": "osu.Game.Rulesets.Catch.Objects",
+            "JuiceStream": "osu.Game.Rulesets.Catch.Objects",
+        },
+    ),
+    "mania": (
+        "osu.Game.Rulesets.Mania",
+        {
+            "ManiaRuleset": "osu.Game.Rulesets.Mania",
+            "HoldNote": "osu.Game.Rulesets.Mania.Objects",
+        },
+    ),
+}
+_LAZY_TYPES = {name: ruleset for ruleset, (_, types) in _RULESET_TYPES.items() for name in types}
+_loaded_rulesets: set[str] = set()
+_load_lock = threading.RLock()
+# 各阶段耗时 (秒)，见 startup_report
+_STARTUP_TIMINGS: dict[str, float] = {}
 
 
-def init_osu_tools(build_dir):
+def __getattr__(name):
+    # 模式相关的类型在第一次访问时加载对应的程序集
+    ruleset = _LAZY_TYPES.get(name)
+    if ruleset is None or not _dotnet_libs_imported:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    load_ruleset(ruleset)
+    return globals()[name]
+
+
+def load_ruleset(ruleset: str):
+    """加载一个模式 (osu / taiko / catch / mania) 的程序集，并把该模式用到的类型绑定到全局变量"""
+    if ruleset in _loaded_rulesets:
+        return
+    with _load_lock:
+        if ruleset in _loaded_rulesets:
+            return
+        import clr
+
+        start = time.perf_counter()
+        assembly, types = _RULESET_TYPES[ruleset]
+        clr.AddReference(assembly)
+        globals().update({name: getattr(importlib.import_module(namespace), name) for name, namespace in types.items()})
+        _STARTUP_TIMINGS["ruleset:%s" % ruleset] = time.perf_counter() - start
+        _loaded_rulesets.add(ruleset)
+
+
+def startup_report() -> dict[str, float]:
+    """返回初始化各阶段的耗时 (秒)，包括运行时启动、公共程序集、按需加载的各模式程序集和 warm up"""
+    return dict(_STARTUP_TIMINGS)
+
+
+def init_osu_tools(build_dir, rulesets: Optional[Iterable[str]] = None):
+    """启动 .NET 运行时并加载公共程序集
+
+    各模式的程序集默认在第一次使用时才加载，``rulesets`` 可以指定需要立即加载的模式，例如 ``["osu"]``
+    """
     global _runtime_initialized, _dotnet_libs_imported
 
     if not _runtime_initialized:
+        start = time.perf_counter()
         runtime_config = os.path.join(build_dir, "PerformanceCalculator.runtimeconfig.json")
         rt = get_coreclr(runtime_config=runtime_config)
         set_runtime(rt)
         sys.path.append(build_dir)
+        _STARTUP_TIMINGS["runtime"] = time.perf_counter() - start
 
         _runtime_initialized = True
 
     if not _dotnet_libs_imported:
+        start = time.perf_counter()
         import clr
 
         # 以下导入顺序非 alphabetic
         clr.AddReference("PerformanceCalculator")
         clr.AddReference("osu.Game")
-        clr.AddReference("osu.Game.Rulesets.Osu")
-        clr.AddReference("osu.Game.Rulesets.Taiko")
-        clr.AddReference("osu.Game.Rulesets.Catch")
-        clr.AddReference("osu.Game.Rulesets.Mania")
         clr.AddReference("Newtonsoft.Json")
 
         # PerformanceCalculator 命名空间
@@ -38,38 +123,22 @@ def init_osu_tools(build_dir):
         # osu.Game 命名空间
         from osu.Game.Beatmaps import IBeatmap, BeatmapExtensions
         from osu.Game.Configuration import SettingSourceExtensions, SettingSourceAttribute
+        from osu.Game.Online.API import APIMod
         from osu.Game.Rulesets import Ruleset
         from osu.Game.Rulesets.Mods import Mod, ModClassic
         from osu.Game.Rulesets.Scoring import HitResult
         from osu.Game.Rulesets.Difficulty.Preprocessing import DifficultyHitObject
-
-        # osu.Game.Rulesets.Osu 命名空间
-        from osu.Game.Rulesets.Osu import OsuRuleset
-        from osu.Game.Rulesets.Osu.Difficulty import OsuDifficultyAttributes, OsuPerformanceAttributes
-        from osu.Game.Rulesets.Osu.Difficulty.Skills import Aim, Speed
-        from osu.Game.Rulesets.Osu.Mods import OsuModClassic
-        from osu.Game.Rulesets.Osu.Objects import Slider, SliderTick, SliderRepeat
-        from osu.Game.Rulesets.Osu.Difficulty.Preprocessing import OsuDifficultyHitObject
-
-        # osu.Game.Rulesets.Taiko 命名空间
-        from osu.Game.Rulesets.Taiko import TaikoRuleset
-
-        # osu.Game.Rulesets.Catch 命名空间
-        from osu.Game.Rulesets.Catch import CatchRuleset
-        from osu.Game.Rulesets.Catch.Objects import Droplet, TinyDroplet, Fruit, JuiceStream
-
-        # osu.Game.Rulesets.Mania 命名空间
-        from osu.Game.Rulesets.Mania import ManiaRuleset
-        from osu.Game.Rulesets.Mania.Objects import HoldNote
         from osu.Game.Scoring import ScoreInfo
         from osu.Game.Utils import ModUtils
 
         # 其他
         import System
-        from System import Array, OperationCanceledException
+        from System import Array, OperationCanceledException, TimeSpan
         from System.Collections.Generic import Dictionary, List
         from System.Reflection import BindingFlags
-        from Newtonsoft.Json import JsonConvert
+        from System.Threading import CancellationToken, CancellationTokenSource
+        from Newtonsoft.Json import JsonConvert, JsonSerializer, NullValueHandling
+        from Newtonsoft.Json.Serialization import JsonObjectContract
 
         # 将类型绑定到全局变量，使其对外可见
         globals().update(
@@ -81,39 +150,109 @@ def init_osu_tools(build_dir):
                 "BeatmapExtensions": BeatmapExtensions,
                 "SettingSourceExtensions": SettingSourceExtensions,
                 "SettingSourceAttribute": SettingSourceAttribute,
+                "APIMod": APIMod,
                 "Ruleset": Ruleset,
                 "Mod": Mod,
                 "ModClassic": ModClassic,
                 "HitResult": HitResult,
                 "DifficultyHitObject": DifficultyHitObject,
-                "OsuRuleset": OsuRuleset,
-                "OsuDifficultyAttributes": OsuDifficultyAttributes,
-                "OsuPerformanceAttributes": OsuPerformanceAttributes,
-                "Aim": Aim,
-                "Speed": Speed,
-                "OsuModClassic": OsuModClassic,
-                "Slider": Slider,
-                "SliderTick": SliderTick,
-                "SliderRepeat": SliderRepeat,
-                "OsuDifficultyHitObject": OsuDifficultyHitObject,
-                "TaikoRuleset": TaikoRuleset,
-                "CatchRuleset": CatchRuleset,
-                "Droplet": Droplet,
-                "TinyDroplet": TinyDroplet,
-                "Fruit": Fruit,
-                "JuiceStream": JuiceStream,
-                "ManiaRuleset": ManiaRuleset,
-                "HoldNote": HoldNote,
                 "ScoreInfo": ScoreInfo,
                 "ModUtils": ModUtils,
                 "System": System,
                 "Array": Array,
                 "OperationCanceledException": OperationCanceledException,
+                "TimeSpan": TimeSpan,
                 "Dictionary": Dictionary,
                 "List": List,
                 "BindingFlags": BindingFlags,
+                "CancellationToken": CancellationToken,
+                "CancellationTokenSource": CancellationTokenSource,
                 "JsonConvert": JsonConvert,
+                "JsonSerializer": JsonSerializer,
+                "NullValueHandling": NullValueHandling,
+                "JsonObjectContract": JsonObjectContract,
             },
         )
+        _STARTUP_TIMINGS["assemblies"] = time.perf_counter() - start
 
         _dotnet_libs_imported = True
+
+    for ruleset in rulesets or ():
+        load_ruleset(ruleset)
+
+
+def _warm_up_beatmap() -> str:
+    # 16 个圆圈和 4 个滑条，足够覆盖各模式的谱面转换、难度计算和 performance 计算路径
+    hit_objects = []
+    for i in range(20):
+        x, y, t = 64 + (i % 4) * 128, 64 + (i // 4) * 64, 1000 + i * 250
+        if i % 5 == 4:
+            hit_objects.append("%d,%d,%d,2,0,B|%d:%d,1,140" % (x, y, t, x + 100, y + 60))
+        else:
+            hit_objects.append("%d,%d,%d,1,0,0:0:0:0:" % (x, y, t))
+    return "\n".join(
+        [
+            "osu file format v14",
+            "",
+            "[General]",
+            "AudioFilename: audio.mp3",
+            "Mode: 0",
+            "",
+            "[Metadata]",
+            "Title:warm up",
+            "Artist:osupp",
+            "Creator:osupp",
+            "Version:warm up",
+            "",
+            "[Difficulty]",
+            "HPDrainRate:5",
+            "CircleSize:4",
+            "OverallDifficulty:8",
+            "ApproachRate:9",
+            "SliderMultiplier:1.4",
+            "SliderTickRate:1",
+            "",
+            "[TimingPoints]",
+            "0,500,4,2,0,100,1,0",
+            "",
+            "[HitObjects]",
+            *hit_objects,
+            "",
+        ],
+    )
+
+
+def warm_up(rulesets: Iterable[str] = ("osu",)):
+    """用内置的小谱面完整跑一遍难度和 performance 计算，提前触发程序集加载和 JIT 编译，避免第一个真实请求成为异常值
+
+    warm up 期间不使用谱面缓存和难度存储，耗时记录在 ``startup_report`` 中
+    """
+    import tempfile
+
+    from .config import get_config, pinned_config
+    from .difficulty import calculate_difficulty
+    from .performance import CatchPerformance, ManiaPerformance, OsuPerformance, TaikoPerformance, calculate_performance
+    from .registry import get_ruleset
+
+    ruleset_ids = {"osu": 0, "taiko": 1, "catch": 2, "mania": 3}
+    perfs = {"osu": OsuPerformance, "taiko": TaikoPerformance, "catch": CatchPerformance, "mania": ManiaPerformance}
+
+    with tempfile.NamedTemporaryFile("w", suffix=".osu", delete=False, encoding="utf-8") as f:
+        f.write(_warm_up_beatmap())
+    config = get_config()
+    config.update(beatmap_cache_maxsize=0, difficulty_store=None, max_hit_objects=None, max_slider_length=None)
+    try:
+        with pinned_config(config):
+            for ruleset in rulesets:
+                load_ruleset(ruleset)
+                start = time.perf_counter()
+                calculate_difficulty(f.name, ruleset_id=ruleset_ids[ruleset])
+                calculator = calculate_performance(f.name, get_ruleset(ruleset_ids[ruleset]), strain_timeline=True)
+                next(calculator)
+                perf = perfs[ruleset]
+                calculator.send(perf(accuracy_percent=98.0, misses=1))
+                calculator.send([perf(), perf(accuracy_percent=95.0)])
+                calculator.close()
+                _STARTUP_TIMINGS["warm_up:%s" % ruleset] = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
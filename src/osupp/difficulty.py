@@ -1,10 +1,32 @@
 from typing import Literal, Optional
 
-from .core import Array, LegacyHelper, OperationCanceledException, ProcessorCommand, ProcessorWorkingBeatmap, Ruleset, SettingSourceExtensions, System
-from .util import Result, re_deserialize, to_snake_case
+from orjson import OPT_INDENT_2, dumps
+
+from .cache import get_working_beatmap
+from .config import pinned_config
+from .core import CancellationToken, OperationCanceledException, Ruleset, SettingSourceExtensions
+from .instrument import CallMetrics, count, count_interop, finish_call, stage, start_call
+from .limits import check_beatmap_limits, read_beatmap_ruleset_id
+from .mods import SETTING_TYPE_NAMES
+from .pipeline import time_budget
+from .registry import canonical_mods, get_ruleset, parse_mods
+from .store import get_difficulty_store
+from .util import Result, beatmap_md5, marked_result, re_deserialize, to_snake_case
+
+# get_all_mods 的结果，按模式 ID 缓存
+_ALL_MODS_CACHE: dict[int, list[dict[str, str | list[dict[str, str | type[str | float | bool]]]]]] = {}
 
 
 def get_all_mods(ruleset: Ruleset) -> list[dict[str, str | list[dict[str, str | type[str | float | bool]]]]]:
+    """返回模式下所有模组的缩写和设置，结果按模式缓存，返回的是共享对象，不要修改"""
+    ruleset_id = ruleset.RulesetInfo.OnlineID
+    all_mods_data = _ALL_MODS_CACHE.get(ruleset_id)
+    if all_mods_data is None:
+        all_mods_data = _ALL_MODS_CACHE.setdefault(ruleset_id, _collect_all_mods(ruleset))
+    return all_mods_data
+
+
+def _collect_all_mods(ruleset: Ruleset) -> list[dict[str, str | list[dict[str, str | type[str | float | bool]]]]]:
     all_mods_data: list[dict[str, str | list[dict[str, str | type[str | float | bool]]]]] = []
     all_mods = ruleset.CreateAllMods()
     all_mods_list = list(all_mods)
@@ -43,6 +65,42 @@ def get_all_mods(ruleset: Ruleset) -> list[dict[str, str | list[dict[str, str |
     return all_mods_data
 
 
+def export_all_mods(path: Optional[str] = None, ruleset_ids: tuple[int, ...] = (0, 1, 2, 3)) -> list[dict]:
+    """导出所有模组的元数据，格式与 ``tests/osu_mods.json`` 相同，可以用 ``osupp.mods`` 在没有 .NET 运行时的进程中读取
+
+    ``path`` 不为 None 时同时写入文件
+    """
+    data = []
+    for ruleset_id in ruleset_ids:
+        ruleset = get_ruleset(ruleset_id)
+        all_mods = list(ruleset.CreateAllMods())
+        mods_data = []
+        for mod, mod_entry in zip(all_mods, get_all_mods(ruleset), strict=True):
+            incompatible_types = list(mod.IncompatibleMods)
+            mods_data.append(
+                {
+                    "Acronym": mod.Acronym,
+                    "Name": mod.Name,
+                    "Description": str(mod.Description),
+                    "Type": mod.Type.ToString(),
+                    "Settings": [{**setting, "Type": SETTING_TYPE_NAMES[setting["Type"]]} for setting in mod_entry["Settings"]],
+                    "IncompatibleMods": [other.Acronym for other in all_mods if any(t.IsInstanceOfType(other) for t in incompatible_types)],
+                    "RequiresConfiguration": mod.RequiresConfiguration,
+                    "UserPlayable": mod.UserPlayable,
+                    "ValidForMultiplayer": mod.ValidForMultiplayer,
+                    "ValidForFreestyleAsRequiredMod": mod.ValidForFreestyleAsRequiredMod,
+                    "ValidForMultiplayerAsFreeMod": mod.ValidForMultiplayerAsFreeMod,
+                    "AlwaysValidForSubmission": mod.AlwaysValidForSubmission,
+                },
+            )
+        data.append({"Name": ruleset.ShortName, "RulesetID": ruleset_id, "Mods": mods_data})
+
+    if path is not None:
+        with open(path, "wb") as f:
+            f.write(dumps(data, option=OPT_INDENT_2))
+    return data
+
+
 def transform_net_type(net_type) -> type[str | float | bool]:
     if net_type is None:
         return str
@@ -64,20 +122,135 @@ def transform_net_type(net_type) -> type[str | float | bool]:
     raise TypeError(f"unknown type: {net_type}")
 
 
-def calculate_difficulty(beatmap_path: str, mods: Optional[list[str]] = None, mod_options: Optional[list[str]] = None, ruleset_id: Optional[Literal[0, 1, 2, 3]] = None) -> Result:
-    working_beatmap = ProcessorWorkingBeatmap(beatmap_path)
+def calculate_difficulty(
+    beatmap_path: str,
+    mods: Optional[list[str]] = None,
+    mod_options: Optional[list[str]] = None,
+    ruleset_id: Optional[Literal[0, 1, 2, 3]] = None,
+    *,
+    cancellation_token: Optional[CancellationToken] = None,
+    timeout: Optional[float] = None,
+) -> Result:
+    return calculate_difficulty_many(beatmap_path, [mods], [mod_options], ruleset_id, cancellation_token=cancellation_token, timeout=timeout)[0]
+
+
+def calculate_difficulty_many(
+    beatmap_path: str,
+    mod_sets: Optional[list[Optional[list[str]]]] = None,
+    mod_options: Optional[list[Optional[list[str]]]] = None,
+    ruleset_id: Optional[Literal[0, 1, 2, 3]] = None,
+    *,
+    cancellation_token: Optional[CancellationToken] = None,
+    timeout: Optional[float] = None,
+) -> list[Result]:
+    """只解析一次谱面并复用同一个难度计算器，依次计算多组模组的难度
+
+    ``mod_options`` 与 ``mod_sets`` 按下标一一对应
+
+    ``mod_sets`` 为 ``None`` 时改用计算器自带的 ``CalculateAllLegacyCombinations`` 计算所有 legacy 模组组合，
+    每个结果的 ``__ek_mods`` 为对应的模组缩写列表；此时被取消或拒绝的谱面返回只有一个带标记的空结果的列表，
+    与没有任何组合的空列表区分
+
+    ``cancellation_token`` 会传递给难度计算器，``timeout`` 为整个调用的秒数上限，
+    取消或超时后对应的结果为空，并带有 ``__ek_cancelled`` 标记
+
+    谱面超出 ``max_hit_objects`` / ``max_slider_length`` 配置时不会解析，结果为空并带有 ``__ek_rejected`` 标记
+    """
+    with pinned_config():
+        metrics = start_call("calculate_difficulty", beatmap_path)
+        try:
+            with stage(metrics, "limits"):
+                rejected = check_beatmap_limits(beatmap_path)
+            if rejected is not None:
+                return [marked_result(rejected=rejected)] if mod_sets is None else [marked_result(rejected=rejected) for _ in mod_sets]
+
+            with time_budget(timeout, cancellation_token) as token:
+                return _calculate_difficulty_many(beatmap_path, mod_sets, mod_options, ruleset_id, token if token is not None else CancellationToken(False), metrics)
+        finally:
+            finish_call(metrics)
+
+
+def _calculate_difficulty_many(
+    beatmap_path: str,
+    mod_sets: Optional[list[Optional[list[str]]]],
+    mod_options: Optional[list[Optional[list[str]]]],
+    ruleset_id: Optional[Literal[0, 1, 2, 3]],
+    cancellation_token: CancellationToken,
+    metrics: Optional[CallMetrics] = None,
+) -> list[Result]:
+    working_beatmap = None
+    store = get_difficulty_store() if mod_sets is not None else None
+    if mod_sets is None or (ruleset_id is None and store is None):
+        with stage(metrics, "parse"):
+            working_beatmap = get_working_beatmap(beatmap_path)
     if ruleset_id is None:
-        ruleset_id = working_beatmap.BeatmapInfo.Ruleset.OnlineID
-    ruleset = LegacyHelper.GetRulesetFromLegacyID(ruleset_id)
-    calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
+        if working_beatmap is not None:
+            ruleset_id = working_beatmap.BeatmapInfo.Ruleset.OnlineID
+        else:
+            # 启用存储时只读取文件头部的模式，全部命中时完全不需要解析谱面
+            with stage(metrics, "header"):
+                ruleset_id = read_beatmap_ruleset_id(beatmap_path)
+    ruleset = get_ruleset(ruleset_id)
+
+    if mod_sets is None:
+        calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
+        try:
+            with stage(metrics, "difficulty"):
+                all_attributes = list(calculator.CalculateAllLegacyCombinations(cancellation_token))
+            count_interop(metrics, "difficulty")
+        except OperationCanceledException:
+            count(metrics, "cancelled")
+            return [marked_result(cancelled=True)]
+        count(metrics, "mod_sets", len(all_attributes))
+        count_interop(metrics, "serialize", len(all_attributes))
+        with stage(metrics, "serialize"):
+            return [re_deserialize(attributes, mods=[mod.Acronym for mod in attributes.Mods]) for attributes in all_attributes]
 
-    if mods is None:
-        mods = []
     if mod_options is None:
-        mod_options = []
-    mod_array = ProcessorCommand.ParseMods(ruleset, Array[str](mods), Array[str](mod_options))
+        mod_options = [None] * len(mod_sets)
+    count(metrics, "mod_sets", len(mod_sets))
+    # 同一次调用中谱面文件的 MD5 只计算一次
+    file_md5 = None
+    if store is not None:
+        with stage(metrics, "store"):
+            file_md5 = beatmap_md5(beatmap_path)
+    calculator = None
+    results: list[Result] = []
+    for mods, options in zip(mod_sets, mod_options, strict=True):
+        with stage(metrics, "mods"):
+            mod_array = parse_mods(ruleset_id, mods, options)
+
+        # 启用持久化存储时先查询，命中则无需解析谱面和计算
+        if store is not None:
+            with stage(metrics, "store"):
+                store_key = store.make_key(beatmap_path, ruleset, canonical_mods(ruleset_id, mods, options), file_md5)
+                stored = store.get(store_key)
+            if stored is not None:
+                count(metrics, "store_hits")
+                results.append(stored)
+                continue
+
+        if calculator is None:
+            if working_beatmap is None:
+                with stage(metrics, "parse"):
+                    working_beatmap = get_working_beatmap(beatmap_path)
+            calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
+
+        try:
+            with stage(metrics, "difficulty"):
+                attributes = calculator.Calculate(mod_array, cancellation_token)
+            count_interop(metrics, "difficulty")
+        except OperationCanceledException:
+            count(metrics, "cancelled")
+            results.append(marked_result(cancelled=True))
+            continue
+        with stage(metrics, "serialize"):
+            result = re_deserialize(attributes)
+        count_interop(metrics, "serialize")
+
+        if store is not None:
+            with stage(metrics, "store"):
+                store.put(store_key, result)
+        results.append(result)
 
-    try:
-        return re_deserialize(calculator.Calculate(mod_array))
-    except OperationCanceledException:
-        return Result({})
+    return results
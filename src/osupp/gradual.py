@@ -0,0 +1,191 @@
+import math
+from collections.abc import Generator
+from typing import Literal, NamedTuple, Optional, Union
+
+from .cache import get_working_beatmap
+from .config import pin_config_generator
+from .core import CancellationToken, ModUtils, OperationCanceledException
+from .instrument import CallMetrics, count, count_interop, finish_call, stage, start_call
+from .performance import BeatmapSummary, CatchPerformance, ExactPerformance, ManiaPerformance, OsuPerformance, ScoreCalculator, TaikoPerformance, summarize_beatmap
+from .pipeline import clone_mods, create_progressive_beatmap, get_playable_beatmap, invoke_non_public
+from .registry import get_ruleset, parse_mods
+from .util import Result, marked_result, re_deserialize
+
+# 每处理这么多个物件检查一次取消
+_CANCELLATION_CHECK_INTERVAL = 64
+
+
+class GradualPoint(NamedTuple):
+    # 已计入的谱面物件数量
+    object_count: int
+    # 最后一个计入的难度物件的结束时间，与 TimedDifficultyAttributes.Time 一致，为谱面时间 (ms)
+    time: float
+    difficulty_attributes: Result
+
+
+def calculate_gradual(
+    beatmap_path: str,
+    mods: Optional[list[str]] = None,
+    mod_options: Optional[list[str]] = None,
+    ruleset_id: Optional[Literal[0, 1, 2, 3]] = None,
+    *,
+    object_counts: Optional[list[int]] = None,
+    times: Optional[list[float]] = None,
+    cancellation_token: Optional[CancellationToken] = None,
+) -> Generator[Union[GradualPoint, Result, list[Result]], Union[OsuPerformance, TaikoPerformance, CatchPerformance, ManiaPerformance, ExactPerformance, list, None], Result]:
+    """生成器模式的渐进难度与 performance 计算器，只遍历一次难度物件，适合计算未打完或失败成绩的 pp
+
+    在计入的谱面物件数量达到 ``object_counts`` 中的值，或谱面时间即将越过 ``times`` 中的值时返回 ``GradualPoint``，
+    两者都为 ``None`` 时每个难度物件都返回一次，与 ``DifficultyCalculator.CalculateTimed`` 相同
+
+    每次返回 ``GradualPoint`` 后可以传入截至该点的 ``OsuPerformance`` 等成绩（或其列表），返回该点的 ``performance_attributes``，
+    可以传入多次；传入 ``None`` （即 ``next``）则继续计算下一个点，因此可以直接用 for 循环遍历
+
+    早于第一个难度物件的点会合并到第一个难度物件，超出谱面的点会合并到最后一个难度物件
+
+    被 ``cancellation_token`` 取消时最后返回一个 ``difficulty_attributes`` 为空并带有 ``__ek_cancelled`` 标记的点
+    （``object_count`` 和 ``time`` 为取消时已计入的位置），生成器结束返回同样带有标记的空结果
+
+    生成器结束返回 ``beatmap_info``
+    """
+    return pin_config_generator(_gradual_generator(beatmap_path, mods, mod_options, ruleset_id, object_counts, times, cancellation_token))
+
+
+def _gradual_generator(
+    beatmap_path: str,
+    mods: Optional[list[str]],
+    mod_options: Optional[list[str]],
+    ruleset_id: Optional[Literal[0, 1, 2, 3]],
+    object_counts: Optional[list[int]],
+    times: Optional[list[float]],
+    cancellation_token: Optional[CancellationToken],
+):
+    metrics = start_call("calculate_gradual", beatmap_path)
+    try:
+        return (yield from _calculate_gradual(beatmap_path, mods, mod_options, ruleset_id, object_counts, times, cancellation_token, metrics))
+    finally:
+        finish_call(metrics)
+
+
+def _calculate_gradual(
+    beatmap_path: str,
+    mods: Optional[list[str]],
+    mod_options: Optional[list[str]],
+    ruleset_id: Optional[Literal[0, 1, 2, 3]],
+    object_counts: Optional[list[int]],
+    times: Optional[list[float]],
+    cancellation_token: Optional[CancellationToken],
+    metrics: Optional[CallMetrics] = None,
+):
+    with stage(metrics, "parse"):
+        working_beatmap = get_working_beatmap(beatmap_path)
+    if ruleset_id is None:
+        ruleset_id = working_beatmap.BeatmapInfo.Ruleset.OnlineID
+    ruleset = get_ruleset(ruleset_id)
+    with stage(metrics, "mods"):
+        # 与 DifficultyCalculator.Calculate 一样使用模组的副本，谱面转换写入的状态不会留在缓存中
+        mod_array = clone_mods(parse_mods(ruleset_id, mods, mod_options))
+    count_interop(metrics, "mods", len(mod_array))
+
+    every_object = object_counts is None and times is None
+    count_targets = sorted(object_counts) if object_counts is not None else []
+    time_targets = sorted(times) if times is not None else []
+
+    calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
+    try:
+        with stage(metrics, "playable_beatmap"):
+            beatmap = get_playable_beatmap(working_beatmap, ruleset, mod_array, cancellation_token)
+        count_interop(metrics, "playable_beatmap")
+        clock_rate = ModUtils.CalculateRateWithMods(mod_array)
+        with stage(metrics, "difficulty_objects"):
+            skills = invoke_non_public(calculator, "CreateSkills", beatmap, mod_array, clock_rate)
+            objects = list(invoke_non_public(calculator, "SortObjects", invoke_non_public(calculator, "CreateDifficultyHitObjects", beatmap, clock_rate)))
+    except OperationCanceledException:
+        count(metrics, "cancelled")
+        return (yield from _cancelled_point(0, 0.0))
+    count(metrics, "difficulty_objects", len(objects))
+    # CreateSkills、CreateDifficultyHitObjects、SortObjects，加上每个难度物件一次枚举
+    count_interop(metrics, "difficulty_objects", 3 + len(objects))
+    skill_count = len(skills)
+
+    progressive_beatmap, progressive_hit_objects = create_progressive_beatmap(calculator, beatmap)
+    hit_objects = beatmap.HitObjects
+    hit_object_count = hit_objects.Count
+    score_calculator = ScoreCalculator(ruleset, working_beatmap.BeatmapInfo, mod_array)
+
+    object_count = processed = 0
+    count_index = time_index = 0
+    time = 0.0
+    try:
+        for i, obj in enumerate(objects):
+            if cancellation_token is not None and i % _CANCELLATION_CHECK_INTERVAL == 0 and cancellation_token.IsCancellationRequested:
+                count(metrics, "cancelled")
+                return (yield from _cancelled_point(object_count, time))
+            is_last = i == len(objects) - 1
+
+            # 与 CalculateTimed 一致，把截至当前难度物件的所有顶层物件加入渐进谱面（包括没有生成难度物件的物件）
+            base_start_time = obj.BaseObject.StartTime
+            while object_count < hit_object_count:
+                hit_object = hit_objects[object_count]
+                if not is_last and hit_object.StartTime > base_start_time:
+                    break
+                progressive_hit_objects.Add(hit_object)
+                object_count += 1
+
+            for skill in skills:
+                skill.Process(obj)
+            processed = i + 1
+
+            time = obj.EndTime * clock_rate
+            next_time = math.inf if is_last else objects[i + 1].EndTime * clock_rate
+            due = every_object
+            while count_index < len(count_targets) and (count_targets[count_index] <= object_count or is_last):
+                count_index += 1
+                due = True
+            while time_index < len(time_targets) and time_targets[time_index] < next_time:
+                time_index += 1
+                due = True
+            if not due:
+                continue
+
+            count(metrics, "points")
+            with stage(metrics, "difficulty"):
+                difficulty_attributes = invoke_non_public(calculator, "CreateDifficultyAttributes", progressive_beatmap, mod_array, skills, clock_rate)
+            count_interop(metrics, "difficulty")
+            with stage(metrics, "serialize"):
+                point = GradualPoint(object_count, time, re_deserialize(difficulty_attributes))
+            count_interop(metrics, "serialize")
+            sent = yield point
+            summary: Optional[BeatmapSummary] = None
+            while sent:
+                if summary is None:
+                    with stage(metrics, "summarize"):
+                        summary = summarize_beatmap(progressive_beatmap, ruleset_id)
+                    count_interop(metrics, "summarize", summary.hit_object_count + 1)
+                score_count = len(sent) if isinstance(sent, list) else 1
+                count(metrics, "scores", score_count)
+                with stage(metrics, "performance"):
+                    response = score_calculator.respond(sent, progressive_beatmap, summary, difficulty_attributes)
+                count_interop(metrics, "performance", score_count + 1)
+                sent = yield response
+
+        return re_deserialize(working_beatmap.BeatmapInfo)
+    finally:
+        # 逐个物件的调用在结束（包括取消和关闭生成器）时汇总，避免在循环中计数
+        _count_progress(metrics, object_count, processed, skill_count)
+
+
+def _count_progress(metrics: Optional[CallMetrics], object_count: int, processed: int, skill_count: int):
+    count(metrics, "hit_objects", object_count)
+    # 每个谱面物件读取一次并加入渐进谱面，每个难度物件对每个 skill 调用一次 Process
+    count_interop(metrics, "progressive_beatmap", 2 * object_count)
+    count_interop(metrics, "process", processed * skill_count)
+
+
+def _cancelled_point(object_count: int, time: float):
+    # 取消时以带有取消标记的点结束，之后传入的成绩也只得到带有取消标记的空结果
+    cancelled = marked_result(cancelled=True)
+    sent = yield GradualPoint(object_count, time, cancelled)
+    while sent:
+        sent = yield [Result(cancelled) for _ in sent] if isinstance(sent, list) else Result(cancelled)
+    return Result(cancelled)
@@ -0,0 +1,193 @@
+import struct
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import Any, BinaryIO, NamedTuple, Optional
+
+from orjson import loads
+
+from .performance import ExactPerformance, calculate_performance
+from .registry import get_ruleset
+from .util import Result
+
+# 旧版 (stable) 成绩的模组位掩码，NC 和 PF 同时带有 DT 和 SD 的位
+_LEGACY_MODS = [
+    (1 << 0, "NF"),
+    (1 << 1, "EZ"),
+    (1 << 2, "TD"),
+    (1 << 3, "HD"),
+    (1 << 4, "HR"),
+    (1 << 5, "SD"),
+    (1 << 6, "DT"),
+    (1 << 7, "RX"),
+    (1 << 8, "HT"),
+    (1 << 9, "NC"),
+    (1 << 10, "FL"),
+    (1 << 11, "AT"),
+    (1 << 12, "SO"),
+    (1 << 13, "AP"),
+    (1 << 14, "PF"),
+    (1 << 15, "4K"),
+    (1 << 16, "5K"),
+    (1 << 17, "6K"),
+    (1 << 18, "7K"),
+    (1 << 19, "8K"),
+    (1 << 20, "FI"),
+    (1 << 21, "RD"),
+    (1 << 22, "CN"),
+    (1 << 23, "TP"),
+    (1 << 24, "9K"),
+    (1 << 25, "DS"),
+    (1 << 26, "1K"),
+    (1 << 27, "3K"),
+    (1 << 28, "2K"),
+    (1 << 29, "SV2"),
+    (1 << 30, "MR"),
+]
+
+
+class ScoreRecord(NamedTuple):
+    ruleset_id: int
+    # 与 score JSON 的 statistics 相同的键，例如 great / ok / large_tick_hit
+    statistics: dict[str, int]
+    mods: list[str]
+    mod_options: list[str]
+    combo: Optional[int] = None
+    beatmap_id: Optional[int] = None
+    beatmap_md5: Optional[str] = None
+    score_id: Optional[int] = None
+
+
+class ScoreResult(NamedTuple):
+    record: ScoreRecord
+    difficulty: Optional[Result] = None
+    performance: Optional[Result] = None
+    error: Optional[str] = None
+
+
+def legacy_mods_to_acronyms(mods: int) -> list[str]:
+    acronyms = [acronym for bit, acronym in _LEGACY_MODS if mods & bit]
+    if "NC" in acronyms:
+        acronyms.remove("DT")
+    if "PF" in acronyms:
+        acronyms.remove("SD")
+    return acronyms
+
+
+def _mod_options(acronym: str, settings: dict[str, Any]) -> list[str]:
+    options = []
+    for name, value in settings.items():
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        options.append(f"{acronym}_{name}={value}")
+    return options
+
+
+def score_from_json(data: dict[str, Any]) -> ScoreRecord:
+    """从 osu! API 的 score JSON（也可以是包含 ``score`` 键的对象）创建记录"""
+    data = data.get("score", data)
+    mods, mod_options = [], []
+    for mod in data.get("mods", []):
+        mods.append(mod["acronym"])
+        mod_options.extend(_mod_options(mod["acronym"], mod.get("settings", {})))
+    beatmap = data.get("beatmap")
+    return ScoreRecord(
+        data["ruleset_id"],
+        {k: v for k, v in data["statistics"].items() if v},
+        mods,
+        mod_options,
+        combo=data.get("max_combo", data.get("combo")),
+        beatmap_id=data.get("beatmap_id", beatmap.get("id") if isinstance(beatmap, dict) else None),
+        beatmap_md5=beatmap.get("checksum") if isinstance(beatmap, dict) else None,
+        score_id=data.get("id"),
+    )
+
+
+def read_json_lines(lines: Iterable[str | bytes]) -> Iterator[ScoreRecord]:
+    for line in lines:
+        if line.strip():
+            yield score_from_json(loads(line))
+
+
+def _read_osr_string(f: BinaryIO) -> str:
+    if f.read(1) == b"\x00":
+        return ""
+    length = shift = 0
+    while True:
+        byte = f.read(1)[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return f.read(length).decode("utf-8")
+
+
+def read_osr(f: BinaryIO) -> ScoreRecord:
+    """读取旧版 .osr 回放的成绩部分，旧版成绩按 lazer 的规则附加 Classic 模组"""
+    ruleset_id, _version = struct.unpack("<Bi", f.read(5))
+    beatmap_md5 = _read_osr_string(f)
+    _read_osr_string(f)  # 玩家名
+    _read_osr_string(f)  # 回放 MD5
+    count_300, count_100, count_50, count_geki, count_katu, count_miss = struct.unpack("<6H", f.read(12))
+    _score, combo, _perfect, mods = struct.unpack("<iH?i", f.read(11))
+    _read_osr_string(f)  # 血量条
+    _timestamp, replay_length = struct.unpack("<qi", f.read(12))
+    f.seek(replay_length, 1)
+    (score_id,) = struct.unpack("<q", f.read(8))
+
+    match ruleset_id:
+        case 0 | 1:
+            statistics = {"great": count_300, "ok": count_100, "meh": count_50, "miss": count_miss}
+        case 2:
+            statistics = {"great": count_300, "large_tick_hit": count_100, "small_tick_hit": count_50, "small_tick_miss": count_katu, "miss": count_miss}
+        case 3:
+            statistics = {"perfect": count_geki, "great": count_300, "good": count_katu, "ok": count_100, "meh": count_50, "miss": count_miss}
+        case _:
+            raise ValueError(f"unknown ruleset: {ruleset_id}")
+    return ScoreRecord(ruleset_id, statistics, legacy_mods_to_acronyms(mods) + ["CL"], [], combo=combo, beatmap_md5=beatmap_md5, score_id=score_id or None)
+
+
+def to_performance(record: ScoreRecord) -> ExactPerformance:
+    """把准确的 hit result 数量转换为成绩，直接写入统计字典，不会经过 hit result 生成和准确率估计"""
+    return ExactPerformance.from_statistics(record.statistics, record.combo)
+
+
+def recalculate(
+    records: Iterable[ScoreRecord],
+    beatmap_resolver: Callable[[ScoreRecord], Optional[str]],
+    chunk_size: int = 10000,
+) -> Iterator[ScoreResult]:
+    """流式重算成绩的 pp
+
+    每次读取 ``chunk_size`` 条记录，按 (谱面, 模式, 模组) 分组，每组只解析和计算一次难度，再一次性发送组内所有成绩
+
+    ``beatmap_resolver`` 返回记录对应的 .osu 文件路径，找不到时返回 None；同一批内的结果按分组顺序返回
+    """
+    records = iter(records)
+    while chunk := list(islice(records, chunk_size)):
+        groups: dict[tuple, list[ScoreRecord]] = {}
+        for record in chunk:
+            beatmap_path = beatmap_resolver(record)
+            if beatmap_path is None:
+                yield ScoreResult(record, error="beatmap not found")
+                continue
+            # 模组顺序不影响计算结果，排序后同一组合的不同写法归入同一组
+            key = (beatmap_path, record.ruleset_id, tuple(sorted(record.mods)), tuple(sorted(record.mod_options)))
+            groups.setdefault(key, []).append(record)
+
+        for (beatmap_path, ruleset_id, mods, mod_options), group in groups.items():
+            yield from _recalculate_group(beatmap_path, ruleset_id, list(mods), list(mod_options), group)
+
+
+def _recalculate_group(beatmap_path: str, ruleset_id: int, mods: list[str], mod_options: list[str], group: list[ScoreRecord]) -> Iterator[ScoreResult]:
+    try:
+        calculator = calculate_performance(beatmap_path, get_ruleset(ruleset_id), mods, mod_options)
+        difficulty = next(calculator)
+        performances = calculator.send([to_performance(record) for record in group])
+        calculator.close()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        for record in group:
+            yield ScoreResult(record, error=error)
+        return
+    for record, performance in zip(group, performances):
+        yield ScoreResult(record, difficulty, performance)
@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+from .config import current_config
+
+# 未启用时所有阶段共用的空上下文，避免每次创建对象
+_NULL_STAGE = nullcontext()
+# 当前线程中 collect_metrics 的收集列表
+_LOCAL = threading.local()
+
+
+class CallMetrics:
+    """一次计算调用的分阶段统计
+
+    ``stages`` 为各阶段累计耗时 (秒)，``entries`` 为各阶段进入的次数，
+    ``interop_calls`` 为各阶段中跨 .NET 边界的调用次数，在调用处显式计数：``Calculate``、谱面转换、``skill.Process``、
+    序列化、模组复制、谱面物件遍历等每次计为一次，谱面和模组缓存内部的解析以及读取属性等零散访问不计入，
+    渐进计算中逐个物件的 ``skill.Process`` 和加入渐进谱面不属于任何阶段，分别记在 ``process`` 和 ``progressive_beatmap`` 下，
+    ``counts`` 为谱面物件数、成绩数、渐进计算的点数等实际处理的对象数量，``wall`` 为从调用开始到结束的总耗时 (秒)
+    """
+
+    __slots__ = ("name", "beatmap_path", "stages", "entries", "interop_calls", "counts", "wall", "_start", "_sinks")
+
+    def __init__(self, name: str, beatmap_path: str, sinks: list):
+        self.name = name
+        self.beatmap_path = beatmap_path
+        self.stages: dict[str, float] = {}
+        self.entries: dict[str, int] = {}
+        self.interop_calls: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+        self.wall = 0.0
+        self._start = time.perf_counter()
+        self._sinks = sinks
+
+    def stage(self, name: str) -> "_Stage":
+        return _Stage(self, name)
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def count_interop(self, stage: str, n: int = 1):
+        self.interop_calls[stage] = self.interop_calls.get(stage, 0) + n
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "beatmap_path": self.beatmap_path, "wall": self.wall, "stages": dict(self.stages), "entries": dict(self.entries), "interop_calls": dict(self.interop_calls), "counts": dict(self.counts)}
+
+    def __repr__(self):
+        return f"CallMetrics({self.to_dict()!r})"
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: CallMetrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.metrics
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        metrics, name = self.metrics, self.name
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + time.perf_counter() - self.start
+        metrics.entries[name] = metrics.entries.get(name, 0) + 1
+
+
+def start_call(name: str, beatmap_path: str) -> Optional[CallMetrics]:
+    """开始统计一次调用，既没有设置 ``metrics_hook`` 也不在 ``collect_metrics`` 中时返回 ``None``，之后的统计全部跳过"""
+    hook = current_config()["metrics_hook"]
+    collectors = getattr(_LOCAL, "collectors", None)
+    if hook is None and not collectors:
+        return None
+    sinks = list(collectors) if collectors else []
+    if hook is not None:
+        sinks.append(hook)
+    return CallMetrics(name, beatmap_path, sinks)
+
+
+def stage(metrics: Optional[CallMetrics], name: str):
+    """``with stage(metrics, "difficulty"):`` 统计一个阶段，``metrics`` 为 ``None`` 时几乎没有开销"""
+    if metrics is None:
+        return _NULL_STAGE
+    return _Stage(metrics, name)
+
+
+def count(metrics: Optional[CallMetrics], name: str, n: int = 1):
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+def count_interop(metrics: Optional[CallMetrics], stage: str, n: int = 1):
+    """记录 ``stage`` 阶段中发出的 ``n`` 次 .NET 调用"""
+    if metrics is not None:
+        metrics.count_interop(stage, n)
+
+
+def finish_call(metrics: Optional[CallMetrics]):
+    """结束统计并把结果交给 ``metrics_hook`` 和所有 ``collect_metrics`` 收集器"""
+    if metrics is None:
+        return
+    metrics.wall = time.perf_counter() - metrics._start
+    for sink in metrics._sinks:
+        if isinstance(sink, list):
+            sink.append(metrics)
+        else:
+            sink(metrics)
+
+
+@contextmanager
+def collect_metrics():
+    """收集当前线程中在此期间开始的所有调用的 ``CallMetrics``
+
+    生成器在第一次 ``next`` 时决定是否统计，结束（或被关闭）时才会出现在列表中
+    """
+    collector: list[CallMetrics] = []
+    collectors = getattr(_LOCAL, "collectors", None)
+    if collectors is None:
+        collectors = _LOCAL.collectors = []
+    collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        # 嵌套使用时按后进先出的顺序退出
+        collectors.pop()
+
+
+def current_collectors() -> list[list[CallMetrics]]:
+    """当前线程中所有 ``collect_metrics`` 的收集列表，配合 ``use_collectors`` 把其他线程中的调用收集到当前线程"""
+    return list(getattr(_LOCAL, "collectors", None) or [])
+
+
+@contextmanager
+def use_collectors(collectors: list[list[CallMetrics]]):
+    """在当前线程中把此期间开始的调用交给 ``collectors``（通常是另一个线程的 ``current_collectors``），退出时恢复原来的收集器"""
+    previous = getattr(_LOCAL, "collectors", None)
+    _LOCAL.collectors = list(collectors)
+    try:
+        yield
+    finally:
+        _LOCAL.collectors = previous
@@ -0,0 +1,81 @@
+from typing import NamedTuple, Optional
+
+from .config import current_config
+
+# hit object 类型的滑条位
+_SLIDER_TYPE = 1 << 1
+
+
+class BeatmapScan(NamedTuple):
+    hit_object_count: int
+    # 滑条像素长度乘以往返次数的最大值
+    max_slider_length: float
+    # [General] 段的 Mode，缺省为 0
+    ruleset_id: int = 0
+
+
+def scan_beatmap(beatmap_path: str) -> BeatmapScan:
+    """只扫描 .osu 文件的 Mode 和 [HitObjects] 段，不做完整解析"""
+    hit_object_count = 0
+    max_slider_length = 0.0
+    ruleset_id = 0
+    in_hit_objects = False
+    with open(beatmap_path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("//"):
+                continue
+            if line.startswith("["):
+                in_hit_objects = line == "[HitObjects]"
+                continue
+            if not in_hit_objects:
+                if line.startswith("Mode"):
+                    ruleset_id = _parse_mode(line, ruleset_id)
+                continue
+            hit_object_count += 1
+            fields = line.split(",", 8)
+            try:
+                if int(fields[3]) & _SLIDER_TYPE:
+                    max_slider_length = max(max_slider_length, float(fields[7]) * int(fields[6]))
+            except (IndexError, ValueError):
+                # 格式错误的物件交给 osu! 的解析器处理
+                pass
+    return BeatmapScan(hit_object_count, max_slider_length, ruleset_id)
+
+
+def read_beatmap_ruleset_id(beatmap_path: str) -> int:
+    """只读取 .osu 文件头部的 Mode，读到 [HitObjects] 为止，比完整解析谱面快得多"""
+    ruleset_id = 0
+    with open(beatmap_path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if line == "[HitObjects]":
+                break
+            if line.startswith("Mode"):
+                return _parse_mode(line, ruleset_id)
+    return ruleset_id
+
+
+def _parse_mode(line: str, default: int) -> int:
+    # 与 osu! 的解析器一样，只认 [General] 段的 "Mode: n"，其他段不会出现这个键
+    key, sep, value = line.partition(":")
+    if not sep or key.strip() != "Mode":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def check_beatmap_limits(beatmap_path: str) -> Optional[str]:
+    """按 ``max_hit_objects`` 和 ``max_slider_length`` 配置检查谱面，超出限制时返回原因，否则返回 None"""
+    max_hit_objects = current_config()["max_hit_objects"]
+    max_slider_length = current_config()["max_slider_length"]
+    if max_hit_objects is None and max_slider_length is None:
+        return None
+    scan = scan_beatmap(beatmap_path)
+    if max_hit_objects is not None and scan.hit_object_count > max_hit_objects:
+        return "hit_object_count %d > %d" % (scan.hit_object_count, max_hit_objects)
+    if max_slider_length is not None and scan.max_slider_length > max_slider_length:
+        return "slider_length %g > %g" % (scan.max_slider_length, max_slider_length)
+    return None
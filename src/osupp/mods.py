@@ -0,0 +1,49 @@
+"""不依赖 .NET 运行时的模组元数据读取与校验，数据来自 ``osupp.difficulty.export_all_mods`` 导出的 JSON 文件"""
+
+from typing import Any
+
+from orjson import loads
+
+# 导出文件中设置类型的名称与 get_all_mods 中 Python 类型的对应关系
+SETTING_TYPE_NAMES: dict[type, str] = {float: "number", bool: "boolean", str: "string"}
+SETTING_TYPES: dict[str, type] = {name: py_type for py_type, name in SETTING_TYPE_NAMES.items()}
+
+
+def load_all_mods(path: str) -> list[dict[str, Any]]:
+    """读取导出的模组元数据，格式与 ``tests/osu_mods.json`` 相同"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def mod_setting_types(all_mods: list[dict[str, Any]], ruleset_id: int) -> dict[str, dict[str, type[str | float | bool]]]:
+    """返回 {模组缩写: {设置名: Python 类型}}，与 ``get_all_mods`` 的类型一致"""
+    ruleset = next(ruleset for ruleset in all_mods if ruleset["RulesetID"] == ruleset_id)
+    return {mod["Acronym"]: {setting["Name"]: SETTING_TYPES[setting["Type"]] for setting in mod["Settings"]} for mod in ruleset["Mods"]}
+
+
+def validate_mods(all_mods: list[dict[str, Any]], ruleset_id: int, mods: list[str], mod_options: list[str]) -> list[str]:
+    """按 ``ProcessorCommand.ParseMods`` 的参数格式校验模组和设置（例如 ``DT`` 和 ``DT_speed_change=1.3``），返回所有错误信息"""
+    setting_types = mod_setting_types(all_mods, ruleset_id)
+    errors = []
+    acronyms = {mod.upper() for mod in mods}
+    for mod in mods:
+        if mod.upper() not in setting_types:
+            errors.append(f"unknown mod: {mod}")
+    for option in mod_options:
+        name, sep, value = option.partition("=")
+        acronym, _, setting = name.partition("_")
+        acronym = acronym.upper()
+        if not sep or not setting:
+            errors.append(f"invalid mod option: {option}")
+        elif acronym not in acronyms:
+            errors.append(f"mod option for unselected mod: {option}")
+        elif acronym not in setting_types or setting not in setting_types[acronym]:
+            errors.append(f"unknown mod option: {option}")
+        elif setting_types[acronym][setting] is float:
+            try:
+                float(value)
+            except ValueError:
+                errors.append(f"invalid number for {name}: {value}")
+        elif setting_types[acronym][setting] is bool and value.lower() not in ("true", "false", "1", "0"):
+            errors.append(f"invalid boolean for {name}: {value}")
+    return errors
@@ -1,42 +1,144 @@
 from collections.abc import Generator
-from functools import singledispatch
+from functools import cache, cached_property, lru_cache, singledispatch
 from typing import NamedTuple, Optional, Union
 
-from .config import _CONFIG
+from . import core
+from .cache import get_working_beatmap
+from .config import current_config, pin_config_generator
 from .core import (
-    Aim,
     Array,
     BeatmapExtensions,
-    CatchRuleset,
+    CancellationToken,
     Dictionary,
-    DifficultyHitObject,
-    Droplet,
-    Fruit,
     HitResult,
-    HoldNote,
     IBeatmap,
-    JuiceStream,
     List,
-    ManiaRuleset,
     Mod,
     ModClassic,
-    ModUtils,
     OperationCanceledException,
-    OsuDifficultyHitObject,
-    OsuModClassic,
-    OsuRuleset,
-    ProcessorCommand,
-    ProcessorWorkingBeatmap,
     Ruleset,
     ScoreInfo,
-    Slider,
-    SliderRepeat,
-    SliderTick,
-    Speed,
-    TaikoRuleset,
-    TinyDroplet,
+    System,
 )
-from .util import Result, re_deserialize
+from .instrument import CallMetrics, count, count_interop, finish_call, stage, start_call
+from .limits import check_beatmap_limits
+from .pipeline import calculate_with_skills, clone_mods, collect_strain_timelines, get_playable_beatmap, time_budget
+from .registry import get_ruleset, parse_mods
+from .util import Result, marked_result, re_deserialize, re_deserialize_many
+
+
+class BeatmapSummary(NamedTuple):
+    """hit result 生成器和准确率计算需要的谱面物件数量，每个 playable beatmap 只需统计一次"""
+
+    hit_object_count: int
+    max_combo: int
+    # osu!
+    slider_count: int = 0
+    large_tick_count: int = 0
+    # osu!catch，droplet_count 不包含 tiny droplet
+    fruit_count: int = 0
+    droplet_count: int = 0
+    tiny_droplet_count: int = 0
+    # osu!mania
+    hold_note_count: int = 0
+
+
+def summarize_beatmap(beatmap: IBeatmap, ruleset_id: int) -> BeatmapSummary:
+    hit_objects = beatmap.HitObjects
+    slider_count = large_tick_count = fruit_count = droplet_count = tiny_droplet_count = hold_note_count = 0
+
+    # 按模式只检查需要的类型，减少跨 pythonnet 边界的调用，模式相关的类型只在用到时加载
+    match ruleset_id:
+        case 0:
+            slider, large_tick_types = core.Slider, (core.SliderTick, core.SliderRepeat)
+            for obj in hit_objects:
+                if isinstance(obj, slider):
+                    slider_count += 1
+                    large_tick_count += sum(1 for nested in obj.NestedHitObjects if isinstance(nested, large_tick_types))
+        case 2:
+            fruit, juice_stream, tiny_droplet, droplet = core.Fruit, core.JuiceStream, core.TinyDroplet, core.Droplet
+            for obj in hit_objects:
+                if isinstance(obj, fruit):
+                    fruit_count += 1
+                elif isinstance(obj, juice_stream):
+                    for nested in obj.NestedHitObjects:
+                        if isinstance(nested, fruit):
+                            fruit_count += 1
+                        elif isinstance(nested, tiny_droplet):
+                            tiny_droplet_count += 1
+                        elif isinstance(nested, droplet):
+                            droplet_count += 1
+        case 3:
+            hold_note = core.HoldNote
+            hold_note_count = sum(1 for obj in hit_objects if isinstance(obj, hold_note))
+
+    return BeatmapSummary(hit_objects.Count, BeatmapExtensions.GetMaxCombo(beatmap), slider_count, large_tick_count, fruit_count, droplet_count, tiny_droplet_count, hold_note_count)
+
+
+class _LazyBeatmapSummary:
+    """单独调用 ``generate_*_hit_results`` / ``get_*_accuracy`` 而没有传入 ``summary`` 时使用
+
+    字段与 ``BeatmapSummary`` 相同，只在第一次读取时统计，例如没有滑条尾 miss 的 osu! 成绩不需要遍历滑条的嵌套物件
+    """
+
+    def __init__(self, beatmap: IBeatmap):
+        self.beatmap = beatmap
+
+    @cached_property
+    def hit_object_count(self) -> int:
+        return self.beatmap.HitObjects.Count
+
+    @cached_property
+    def max_combo(self) -> int:
+        return BeatmapExtensions.GetMaxCombo(self.beatmap)
+
+    @cached_property
+    def slider_count(self) -> int:
+        slider = core.Slider
+        return sum(1 for obj in self.beatmap.HitObjects if isinstance(obj, slider))
+
+    @cached_property
+    def large_tick_count(self) -> int:
+        slider, large_tick_types = core.Slider, (core.SliderTick, core.SliderRepeat)
+        return sum(1 for obj in self.beatmap.HitObjects if isinstance(obj, slider) for nested in obj.NestedHitObjects if isinstance(nested, large_tick_types))
+
+    @cached_property
+    def hold_note_count(self) -> int:
+        hold_note = core.HoldNote
+        return sum(1 for obj in self.beatmap.HitObjects if isinstance(obj, hold_note))
+
+
+# 扫描准确率的曲线在不同谱面和模组之间会反复遇到相同的参数，估计结果只与这些标量有关，缓存后直接复用
+_HIT_RESULT_CACHE_MAXSIZE = 65536
+
+
+@lru_cache(maxsize=_HIT_RESULT_CACHE_MAXSIZE)
+def _estimate_osu_oks_and_mehs(total_result_count: int, count_miss: int, accuracy: float) -> tuple[int, int]:
+    relevant_result_count = total_result_count - count_miss
+    if relevant_result_count <= 0:
+        relevant_accuracy = 0.0
+    else:
+        relevant_accuracy = accuracy * total_result_count / relevant_result_count
+    relevant_accuracy = max(0.0, min(1.0, relevant_accuracy))
+
+    if relevant_accuracy >= 0.25:
+        ratio_50_to_100 = (1 - (relevant_accuracy - 0.25) / 0.75) ** 2
+        count_100_estimate = 6 * relevant_result_count * (1 - relevant_accuracy) / (5 * ratio_50_to_100 + 4)
+        count_50_estimate = count_100_estimate * ratio_50_to_100
+        count_ok = round(count_100_estimate)
+        count_meh = round(count_100_estimate + count_50_estimate) - count_ok
+    elif relevant_accuracy >= 1.0 / 6:
+        count_100_estimate = 6 * relevant_result_count * relevant_accuracy - relevant_result_count
+        count_50_estimate = relevant_result_count - count_100_estimate
+        count_ok = round(count_100_estimate)
+        count_meh = round(count_100_estimate + count_50_estimate) - count_ok
+    else:
+        count_50_estimate = 6 * relevant_result_count * relevant_accuracy
+        count_ok = 0
+        count_meh = round(count_50_estimate)
+        # 似乎这里并不需要重新计算 miss 数量？
+        # count_miss = total_result_count - count_meh
+    return count_ok, count_meh
 
 
 # 对应 OsuSimulateCommand.cs 的 generateHitResults
@@ -52,37 +154,17 @@ def generate_osu_hit_results(
     # 为了便于使用，Slider Tick 和 Slider Tail 可以直接传递 Hit 数，如果使用，这将覆盖二者的 Miss 数设置
     count_large_tick_hits: Optional[int] = None,
     count_slider_tail_hits: Optional[int] = None,
+    summary: Optional[BeatmapSummary] = None,
 ) -> dict[HitResult | str, int]:
+    if summary is None:
+        summary = _LazyBeatmapSummary(beatmap)
     count_great: int
-    total_result_count: int = beatmap.HitObjects.Count
+    total_result_count: int = summary.hit_object_count
 
     if count_meh is not None or count_ok is not None:
         count_great = total_result_count - (count_ok or 0) - (count_meh or 0) - count_miss
     else:
-        relevant_result_count = total_result_count - count_miss
-        if relevant_result_count <= 0:
-            relevant_accuracy = 0.0
-        else:
-            relevant_accuracy = accuracy * total_result_count / relevant_result_count
-        relevant_accuracy = max(0.0, min(1.0, relevant_accuracy))
-
-        if relevant_accuracy >= 0.25:
-            ratio_50_to_100 = (1 - (relevant_accuracy - 0.25) / 0.75) ** 2
-            count_100_estimate = 6 * relevant_result_count * (1 - relevant_accuracy) / (5 * ratio_50_to_100 + 4)
-            count_50_estimate = count_100_estimate * ratio_50_to_100
-            count_ok = round(count_100_estimate)
-            count_meh = round(count_100_estimate + count_50_estimate) - count_ok
-        elif relevant_accuracy >= 1.0 / 6:
-            count_100_estimate = 6 * relevant_result_count * relevant_accuracy - relevant_result_count
-            count_50_estimate = relevant_result_count - count_100_estimate
-            count_ok = round(count_100_estimate)
-            count_meh = round(count_100_estimate + count_50_estimate) - count_ok
-        else:
-            count_50_estimate = 6 * relevant_result_count * relevant_accuracy
-            count_ok = 0
-            count_meh = round(count_50_estimate)
-            # 似乎这里并不需要重新计算 miss 数量？
-            # count_miss = total_result_count - count_meh
+        count_ok, count_meh = _estimate_osu_oks_and_mehs(total_result_count, count_miss, accuracy)
         count_great = int(total_result_count - (count_ok or 0) - (count_meh or 0) - count_miss)
 
     result = {HitResult.Great: count_great, HitResult.Ok: count_ok or 0, HitResult.Meh: count_meh or 0, HitResult.Miss: count_miss}
@@ -91,8 +173,7 @@ def generate_osu_hit_results(
         result[HitResult.LargeTickMiss] = count_large_tick_misses
 
     if count_slider_tail_misses is not None:
-        slider_count = sum(1 for obj in beatmap.HitObjects if isinstance(obj, Slider))
-        result[HitResult.SliderTailHit] = slider_count - count_slider_tail_misses
+        result[HitResult.SliderTailHit] = summary.slider_count - count_slider_tail_misses
 
     # 以下是个人新增内容，新增的键值对在内部处理时直接用 Python 字符串作为键名，在后续传递回 C# 时会删除
     # 逻辑在最后确保传递 Hit 数的优先级最高
@@ -105,7 +186,9 @@ def generate_osu_hit_results(
 
 
 # 对应 OsuSimulateCommand.cs 的 GetAccuracy
-def get_osu_accuracy(beatmap: IBeatmap, statistics: dict[HitResult | str, int], mods: Array[Mod]):
+def get_osu_accuracy(beatmap: IBeatmap, statistics: dict[HitResult | str, int], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None):
+    if summary is None:
+        summary = _LazyBeatmapSummary(beatmap)
     count_great: int = statistics[HitResult.Great]
     count_ok: int = statistics[HitResult.Ok]
     count_meh: int = statistics[HitResult.Meh]
@@ -115,13 +198,13 @@ def get_osu_accuracy(beatmap: IBeatmap, statistics: dict[HitResult | str, int],
 
     if HitResult.SliderTailHit in statistics:
         count_slider_tail_hit = statistics[HitResult.SliderTailHit]
-        count_sliders = sum(1 for obj in beatmap.HitObjects if isinstance(obj, Slider))
+        count_sliders = summary.slider_count
         total += 3 * count_slider_tail_hit
         max_score += 3 * count_sliders
 
     if HitResult.LargeTickMiss in statistics or "large_tick_hits" in statistics:
         count_large_tick_miss = statistics.get(HitResult.LargeTickMiss, 0)
-        count_large_ticks = sum(1 for obj in beatmap.HitObjects for nested in obj.NestedHitObjects if isinstance(nested, (SliderTick, SliderRepeat)))
+        count_large_ticks = summary.large_tick_count
         count_large_tick_hit = statistics.get("large_tick_hits", count_large_ticks - count_large_tick_miss)
         total += 0.6 * count_large_tick_hit
         max_score += 0.6 * count_large_ticks
@@ -138,8 +221,12 @@ def generate_taiko_hit_results(
     accuracy: float,
     count_miss: int,
     count_ok: Optional[int] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
 ) -> dict[HitResult, int]:
-    total_result_count = BeatmapExtensions.GetMaxCombo(beatmap)
+    if summary is None:
+        summary = _LazyBeatmapSummary(beatmap)
+    total_result_count = summary.max_combo
 
     count_great: int
 
@@ -159,7 +246,7 @@ def generate_taiko_hit_results(
 
 
 # 对应 TaikoSimulateCommand.cs 的 GetAccuracy
-def get_taiko_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod]):
+def get_taiko_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None):
     count_great = statistics[HitResult.Great]
     count_ok = statistics[HitResult.Ok]
     count_miss = statistics[HitResult.Miss]
@@ -178,11 +265,15 @@ def generate_catch_hit_results(
     count_miss: int,
     count_small_tick_hit: Optional[int] = None,
     count_large_tick_hit: Optional[int] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
 ) -> dict[HitResult, int]:
-    max_combo = BeatmapExtensions.GetMaxCombo(beatmap)
-    max_small_tick_hit = sum(1 for obj in beatmap.HitObjects if isinstance(obj, JuiceStream) for nested in obj.NestedHitObjects if isinstance(nested, TinyDroplet))
-    max_large_tick_hit = sum(1 for obj in beatmap.HitObjects if isinstance(obj, JuiceStream) for nested in obj.NestedHitObjects if isinstance(nested, Droplet)) - max_small_tick_hit
-    max_great = sum(1 if isinstance(obj, Fruit) else sum(1 for nested in obj.NestedHitObjects if isinstance(nested, Fruit)) if isinstance(obj, JuiceStream) else 0 for obj in beatmap.HitObjects)
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 2)
+    max_combo = summary.max_combo
+    max_small_tick_hit = summary.tiny_droplet_count
+    max_large_tick_hit = summary.droplet_count
+    max_great = summary.fruit_count
 
     if count_large_tick_hit is None:
         count_large_tick_hit = max(0, max_large_tick_hit - count_miss)
@@ -204,7 +295,7 @@ def generate_catch_hit_results(
 
 
 # 对应 CatchSimulateCommand.cs 的 GetAccuracy
-def get_catch_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod]):
+def get_catch_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None):
     hits = statistics[HitResult.Great] + statistics[HitResult.LargeTickHit] + statistics[HitResult.SmallTickHit]
     total = hits + statistics[HitResult.Miss] + statistics[HitResult.SmallTickMiss]
 
@@ -214,6 +305,32 @@ def get_catch_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods
     return hits / total
 
 
+@lru_cache(maxsize=_HIT_RESULT_CACHE_MAXSIZE)
+def _fill_mania_hit_results(total_hits: int, is_classic: bool, target_total: int, count_miss: int) -> tuple[int, int, int, int, int]:
+    """按 perfect / great / good / ok / meh 的顺序贪心分配，只与总数、Classic 状态、目标分数和 miss 数有关，可以在谱面和模组之间共享"""
+    perfect_value = 60 if is_classic else 61
+
+    remaining_hits = total_hits - count_miss
+    delta = max(target_total - (10 * remaining_hits), 0)
+
+    count_perfect = min(delta // (perfect_value - 10), remaining_hits)
+    delta -= count_perfect * (perfect_value - 10)
+    remaining_hits -= count_perfect
+
+    count_great = min(delta // 50, remaining_hits)
+    delta -= count_great * 50
+    remaining_hits -= count_great
+
+    count_good = min(delta // 30, remaining_hits)
+    delta -= count_good * 30
+    remaining_hits -= count_good
+
+    count_ok = min(delta // 10, remaining_hits)
+    remaining_hits -= count_ok
+
+    return count_perfect, count_great, count_good, count_ok, remaining_hits
+
+
 # 对应 ManiaSimulateCommand.cs 的 generateHitResults
 def generate_mania_hit_results(
     beatmap: IBeatmap,
@@ -224,11 +341,15 @@ def generate_mania_hit_results(
     count_ok: Optional[int] = None,
     count_good: Optional[int] = None,
     count_great: Optional[int] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
 ) -> dict[HitResult, int]:
+    if summary is None:
+        summary = _LazyBeatmapSummary(beatmap)
     is_classic = any(isinstance(m, ModClassic) for m in mods)
-    total_hits = beatmap.HitObjects.Count
+    total_hits = summary.hit_object_count
     if not is_classic:
-        total_hits += sum(1 for obj in beatmap.HitObjects if isinstance(obj, HoldNote))
+        total_hits += summary.hold_note_count
 
     if count_meh is not None or count_ok is not None or count_good is not None or count_great is not None:
         count_perfect = total_hits - (count_miss + (count_meh or 0) + (count_ok or 0) + (count_good or 0) + (count_great or 0))
@@ -244,26 +365,7 @@ def generate_mania_hit_results(
     perfect_value = 60 if is_classic else 61
 
     target_total = int(round(accuracy * total_hits * perfect_value))
-
-    remaining_hits = total_hits - count_miss
-    delta = max(target_total - (10 * remaining_hits), 0)
-
-    count_perfect = min(delta // (perfect_value - 10), remaining_hits)
-    delta -= count_perfect * (perfect_value - 10)
-    remaining_hits -= count_perfect
-
-    count_great = min(delta // 50, remaining_hits)
-    delta -= count_great * 50
-    remaining_hits -= count_great
-
-    count_good = min(delta // 30, remaining_hits)
-    delta -= count_good * 30
-    remaining_hits -= count_good
-
-    count_ok = min(delta // 10, remaining_hits)
-    remaining_hits -= count_ok
-
-    count_meh = remaining_hits
+    count_perfect, count_great, count_good, count_ok, count_meh = _fill_mania_hit_results(total_hits, is_classic, target_total, count_miss)
 
     return {
         HitResult.Perfect: count_perfect,
@@ -276,7 +378,7 @@ def generate_mania_hit_results(
 
 
 # 对应 ManiaSimulateCommand.cs 的 GetAccuracy
-def get_mania_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod]):
+def get_mania_accuracy(beatmap: IBeatmap, statistics: dict[HitResult, int], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None):
     count_perfect = statistics[HitResult.Perfect]
     count_great = statistics[HitResult.Great]
     count_good = statistics[HitResult.Good]
@@ -332,128 +434,268 @@ class ManiaPerformance(NamedTuple):
     greats: Optional[int] = None
 
 
+class ExactPerformance(NamedTuple):
+    """已知准确 hit result 数量的成绩，适用于任意模式，不经过 hit result 生成和准确率估计
+
+    ``statistics`` 的键与 score JSON 的 statistics 相同（例如 great / ok / large_tick_hit / slider_tail_hit），
+    需要给出所有非零的数量，通常用 ``ExactPerformance.from_statistics`` 创建
+    """
+
+    statistics: tuple[tuple[str, int], ...]
+    combo: Optional[int] = None
+
+    @classmethod
+    def from_statistics(cls, statistics: dict[str, int], combo: Optional[int] = None) -> "ExactPerformance":
+        # 排序后的元组可以哈希，便于 PerformanceSolver 和 AsyncCalculator 缓存
+        return cls(tuple(sorted((k, v) for k, v in statistics.items() if v)), combo)
+
+
+@cache
+def hit_result_from_name(name: str) -> HitResult:
+    """把 score JSON 的 statistics 键（如 ``large_tick_hit``）转换为 ``HitResult``"""
+    return getattr(HitResult, name.title().replace("_", ""))
+
+
 # 对应 SimulateCommand.cs 的 GenerateHitResults
 @singledispatch
-def generate_hit_result(perf, beatmap: IBeatmap, mods: Array[Mod]) -> dict[HitResult | str, int]:
+def generate_hit_result(perf, beatmap: IBeatmap, mods: Array[Mod], summary: Optional[BeatmapSummary] = None) -> dict[HitResult | str, int]:
     raise NotImplementedError
 
 
 @generate_hit_result.register(OsuPerformance)
-def _(perf: OsuPerformance, beatmap: IBeatmap, mods: Array[Mod]):
+def _(perf: OsuPerformance, beatmap: IBeatmap, mods: Array[Mod], summary: Optional[BeatmapSummary] = None):
     # 这里完全依赖 mods 判断是否是 Classic，Slider Tick 和 Slider Tail 的值不作为判断方式
-    if any(isinstance(m, OsuModClassic) and m.NoSliderHeadAccuracy.Value for m in mods):
-        return generate_osu_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, None, None)
+    if any(isinstance(m, core.OsuModClassic) and m.NoSliderHeadAccuracy.Value for m in mods):
+        return generate_osu_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, None, None, summary=summary)
     else:
-        return generate_osu_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, perf.large_tick_misses, perf.slider_tail_misses, count_large_tick_hits=perf.large_tick_hits, count_slider_tail_hits=perf.slider_tail_hits)
+        return generate_osu_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, perf.large_tick_misses, perf.slider_tail_misses, count_large_tick_hits=perf.large_tick_hits, count_slider_tail_hits=perf.slider_tail_hits, summary=summary)
 
 
 @generate_hit_result.register(TaikoPerformance)
-def _(perf: TaikoPerformance, beatmap: IBeatmap, mods: Array[Mod]):
-    return generate_taiko_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.oks)
+def _(perf: TaikoPerformance, beatmap: IBeatmap, mods: Array[Mod], summary: Optional[BeatmapSummary] = None):
+    return generate_taiko_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.oks, summary=summary)
 
 
 @generate_hit_result.register(CatchPerformance)
-def _(perf: CatchPerformance, beatmap: IBeatmap, mods: Array[Mod]):
-    return generate_catch_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.small_tick_hits, perf.large_tick_hits)
+def _(perf: CatchPerformance, beatmap: IBeatmap, mods: Array[Mod], summary: Optional[BeatmapSummary] = None):
+    return generate_catch_hit_results(beatmap, perf.accuracy_percent / 100.0, perf.misses, perf.small_tick_hits, perf.large_tick_hits, summary=summary)
 
 
 @generate_hit_result.register(ManiaPerformance)
-def _(perf: ManiaPerformance, beatmap: IBeatmap, mods: Array[Mod]):
-    return generate_mania_hit_results(beatmap, mods, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, perf.goods, perf.greats)
+def _(perf: ManiaPerformance, beatmap: IBeatmap, mods: Array[Mod], summary: Optional[BeatmapSummary] = None):
+    return generate_mania_hit_results(beatmap, mods, perf.accuracy_percent / 100.0, perf.misses, perf.mehs, perf.oks, perf.goods, perf.greats, summary=summary)
 
 
-def get_accuracy(perf, beatmap: IBeatmap, statistics: dict[HitResult | str, int], mods: Array[Mod]):
+def get_accuracy(perf, beatmap: IBeatmap, statistics: dict[HitResult | str, int], mods: Array[Mod], summary: Optional[BeatmapSummary] = None):
     match perf:
         case OsuPerformance():
-            return get_osu_accuracy(beatmap, statistics, mods)
+            return get_osu_accuracy(beatmap, statistics, mods, summary=summary)
         case TaikoPerformance():
-            return get_taiko_accuracy(beatmap, statistics, mods)
+            return get_taiko_accuracy(beatmap, statistics, mods, summary=summary)
         case CatchPerformance():
-            return get_catch_accuracy(beatmap, statistics, mods)
+            return get_catch_accuracy(beatmap, statistics, mods, summary=summary)
         case ManiaPerformance():
-            return get_mania_accuracy(beatmap, statistics, mods)
+            return get_mania_accuracy(beatmap, statistics, mods, summary=summary)
         case _:
             raise NotImplementedError
 
 
+class ScoreCalculator:
+    """在同一谱面的多次 performance 计算中复用 performance 计算器、``ScoreInfo`` 和统计字典，每次只更新与成绩相关的字段"""
+
+    def __init__(self, ruleset: Ruleset, beatmap_info, mod_array: Array[Mod]):
+        self.mod_array = mod_array
+        self.performance_calculator = ruleset.CreatePerformanceCalculator()
+        self.score_info = ScoreInfo()
+        self.score_info.BeatmapInfo = beatmap_info
+        self.score_info.Ruleset = ruleset.RulesetInfo
+        self.score_info.Mods = mod_array
+        self.net_statistics = Dictionary[HitResult, int]()
+        # 准确成绩只需要按模式和模组决定的权重，在这里一次确定
+        self.ruleset_id = ruleset.RulesetInfo.OnlineID
+        self.is_classic = any(isinstance(m, ModClassic) for m in mod_array)
+        self.no_slider_head_accuracy = self.ruleset_id == 0 and any(isinstance(m, core.OsuModClassic) and m.NoSliderHeadAccuracy.Value for m in mod_array)
+
+    def calculate(self, perf, beatmap: IBeatmap, summary: BeatmapSummary, difficulty_attributes):
+        if isinstance(perf, ExactPerformance):
+            return self.calculate_exact(perf, summary, difficulty_attributes)
+
+        hit_results = generate_hit_result(perf, beatmap, self.mod_array, summary)
+
+        self.score_info.Accuracy = get_accuracy(perf, beatmap, hit_results, self.mod_array, summary)
+        self.score_info.MaxCombo = perf.combo if hasattr(perf, "combo") and perf.combo is not None else summary.max_combo
+
+        # 这里要把 Python 字典转换为 C# 字典，同时排除个人新增的一些键
+        self.net_statistics.Clear()
+        for k, v in hit_results.items():
+            if k not in ["large_tick_hits"]:
+                self.net_statistics[k] = v
+        self.score_info.Statistics = self.net_statistics
+
+        return self.performance_calculator.Calculate(self.score_info, difficulty_attributes)
+
+    def calculate_exact(self, perf: ExactPerformance, summary: BeatmapSummary, difficulty_attributes):
+        """直接把准确的数量写入复用的统计字典，准确率只用 ``summary`` 中的谱面最大值计算，不再遍历谱面物件"""
+        self.net_statistics.Clear()
+        statistics: dict[HitResult, int] = {}
+        for name, n in perf.statistics:
+            hit_result = hit_result_from_name(name)
+            statistics[hit_result] = n
+            self.net_statistics[hit_result] = n
+        self.score_info.Statistics = self.net_statistics
+        self.score_info.Accuracy = self.exact_accuracy(statistics, summary)
+        self.score_info.MaxCombo = perf.combo if perf.combo is not None else summary.max_combo
+
+        return self.performance_calculator.Calculate(self.score_info, difficulty_attributes)
+
+    def exact_accuracy(self, statistics: dict[HitResult, int], summary: BeatmapSummary) -> float:
+        """与各模式 ``get_*_accuracy`` 的权重相同，缺少的数量视为 0"""
+        get = statistics.get
+        match self.ruleset_id:
+            case 0:
+                total = 6 * get(HitResult.Great, 0) + 2 * get(HitResult.Ok, 0) + get(HitResult.Meh, 0)
+                max_score = 6 * (get(HitResult.Great, 0) + get(HitResult.Ok, 0) + get(HitResult.Meh, 0) + get(HitResult.Miss, 0))
+                # 与 get_osu_accuracy 一致，只有成绩中带有对应判定时才计入 Slider Tail 和 Slider Tick（stable 成绩没有这些判定），
+                # 且与 generate_hit_result 一致，Classic 取消滑条头判定时都不计入
+                if not self.no_slider_head_accuracy:
+                    if HitResult.SliderTailHit in statistics:
+                        total += 3 * statistics[HitResult.SliderTailHit]
+                        max_score += 3 * summary.slider_count
+                    if HitResult.LargeTickHit in statistics or HitResult.LargeTickMiss in statistics:
+                        total += 0.6 * get(HitResult.LargeTickHit, summary.large_tick_count - get(HitResult.LargeTickMiss, 0))
+                        max_score += 0.6 * summary.large_tick_count
+            case 1:
+                total = 2 * get(HitResult.Great, 0) + get(HitResult.Ok, 0)
+                max_score = 2 * (get(HitResult.Great, 0) + get(HitResult.Ok, 0) + get(HitResult.Miss, 0))
+            case 2:
+                total = get(HitResult.Great, 0) + get(HitResult.LargeTickHit, 0) + get(HitResult.SmallTickHit, 0)
+                max_score = total + get(HitResult.Miss, 0) + get(HitResult.LargeTickMiss, 0) + get(HitResult.SmallTickMiss, 0)
+            case 3:
+                perfect_weight = 300 if self.is_classic else 305
+                total = perfect_weight * get(HitResult.Perfect, 0) + 300 * get(HitResult.Great, 0) + 200 * get(HitResult.Good, 0) + 100 * get(HitResult.Ok, 0) + 50 * get(HitResult.Meh, 0)
+                max_score = perfect_weight * (get(HitResult.Perfect, 0) + get(HitResult.Great, 0) + get(HitResult.Good, 0) + get(HitResult.Ok, 0) + get(HitResult.Meh, 0) + get(HitResult.Miss, 0))
+            case _:
+                raise NotImplementedError
+
+        if max_score == 0:
+            return 0.0
+
+        return total / max_score
+
+    def respond(self, sent, beatmap: IBeatmap, summary: BeatmapSummary, difficulty_attributes) -> Union[Result, list[Result]]:
+        """处理生成器收到的单个成绩或成绩列表"""
+        if isinstance(sent, list):
+            # 批量计算时只做一次序列化
+            performance_attributes_list = List[System.Object]()
+            for perf in sent:
+                performance_attributes_list.Add(self.calculate(perf, beatmap, summary, difficulty_attributes))
+            return re_deserialize_many(performance_attributes_list)
+        return re_deserialize(self.calculate(sent, beatmap, summary, difficulty_attributes))
+
+
 def calculate_performance(
     beatmap_path: str,
     ruleset: Ruleset,
     mods: Optional[list[str]] = None,
     mod_options: Optional[list[str]] = None,
     **kwargs,
-) -> Generator[Result, Union[OsuPerformance, TaikoPerformance, CatchPerformance, ManiaPerformance, None], Result]:
-    working_beatmap = ProcessorWorkingBeatmap(beatmap_path)
-    if mods is None:
-        mods = []
-    if mod_options is None:
-        mod_options = []
-    mod_array = ProcessorCommand.ParseMods(ruleset, Array[str](mods), Array[str](mod_options))
+) -> Generator[Union[Result, list[Result]], Union[OsuPerformance, TaikoPerformance, CatchPerformance, ManiaPerformance, ExactPerformance, list, None], Result]:
+    # 配置在创建生成器时固定，之后即使在其它线程中驱动生成器或修改配置，本次计算也使用同一份配置
+    return pin_config_generator(_performance_generator(beatmap_path, ruleset, mods, mod_options, **kwargs))
+
+
+def _performance_generator(beatmap_path: str, ruleset: Ruleset, mods: Optional[list[str]], mod_options: Optional[list[str]], **kwargs):
+    metrics = start_call("calculate_performance", beatmap_path)
+    try:
+        with stage(metrics, "limits"):
+            rejected = check_beatmap_limits(beatmap_path)
+        if rejected is not None:
+            # 超出限制的谱面不解析，所有结果都只带有拒绝原因
+            yield from _respond_marked(marked_result(rejected=rejected))
+            return marked_result(rejected=rejected)
+
+        with time_budget(kwargs.get("timeout"), kwargs.get("cancellation_token")) as cancellation_token:
+            return (yield from _calculate_performance(beatmap_path, ruleset, mods, mod_options, cancellation_token, kwargs.get("strain_timeline") and current_config()["strain_timeline"], metrics))
+    finally:
+        finish_call(metrics)
+
+
+def _respond_marked(result: Result):
+    sent = yield result
+    while sent:
+        sent = yield [Result(result) for _ in sent] if isinstance(sent, list) else Result(result)
+
+
+def _calculate_performance(
+    beatmap_path: str,
+    ruleset: Ruleset,
+    mods: Optional[list[str]],
+    mod_options: Optional[list[str]],
+    cancellation_token: Optional[CancellationToken],
+    strain_timeline: bool,
+    metrics: Optional[CallMetrics] = None,
+):
+    with stage(metrics, "parse"):
+        working_beatmap = get_working_beatmap(beatmap_path)
+    with stage(metrics, "mods"):
+        # 谱面转换和 skill 会修改模组的状态，每次计算使用缓存模组的副本
+        mod_array = clone_mods(parse_mods(ruleset.RulesetInfo.OnlineID, mods, mod_options))
+    count_interop(metrics, "mods", len(mod_array))
 
     difficulty_calculator = ruleset.CreateDifficultyCalculator(working_beatmap)
 
-    # 如果难度计算失败，则直接返回，后面的步骤全部失效，避免进一步耗时（虽然这已经很耗时了的说）
+    # 如果难度计算被取消，则后面的步骤全部失效，只返回带有取消标记的空结果，避免进一步耗时（虽然这已经很耗时了的说）
     # 虽然从数据分析的角度，剔除异常值是最好的选择
     # 但是使用这个库的目的不一定是数据分析，因此还是把所有内容都呈现出来
     try:
-        difficulty_attributes = difficulty_calculator.Calculate(mod_array)
+        if strain_timeline:
+            # 直接复用难度计算时的 skill 实例读取 strain timeline，strain 只计算一次
+            with stage(metrics, "playable_beatmap"):
+                beatmap = get_playable_beatmap(working_beatmap, ruleset, mod_array, cancellation_token)
+            count_interop(metrics, "playable_beatmap")
+            with stage(metrics, "difficulty"):
+                difficulty_pass = calculate_with_skills(difficulty_calculator, beatmap, mod_array, cancellation_token)
+            count_interop(metrics, "difficulty", difficulty_pass.interop_calls)
+            difficulty_attributes = difficulty_pass.attributes
+        else:
+            with stage(metrics, "difficulty"):
+                difficulty_attributes = difficulty_calculator.Calculate(mod_array) if cancellation_token is None else difficulty_calculator.Calculate(mod_array, cancellation_token)
+            count_interop(metrics, "difficulty")
+            with stage(metrics, "playable_beatmap"):
+                beatmap = get_playable_beatmap(working_beatmap, ruleset, mod_array, cancellation_token)
+            count_interop(metrics, "playable_beatmap")
     except OperationCanceledException:
-        pass
+        count(metrics, "cancelled")
+        yield from _respond_marked(marked_result(cancelled=True))
     else:
-        beatmap = working_beatmap.GetPlayableBeatmap(ruleset.RulesetInfo, mod_array)
-
-        # 额外处理：主模式 strainTimeline patch
-        if kwargs.get("strain_timeline") and _CONFIG["strain_timeline"]:
-            clock_rate = ModUtils.CalculateRateWithMods(mod_array)
-
-            # 对应 osu 项目 OsuDifficultyCalculator.cs 的 CreateDifficultyHitObjects
-            objects = List[DifficultyHitObject]()
-            for i in range(1, beatmap.HitObjects.Count):
-                objects.Add(
-                    OsuDifficultyHitObject(
-                        beatmap.HitObjects[i],
-                        beatmap.HitObjects[i - 1],
-                        clock_rate,
-                        objects,
-                        objects.Count,
-                    ),
-                )
-
-            aim = Aim(mod_array, True)
-            speed = Speed(mod_array)
-
-            for obj in objects:
-                aim.Process(obj)
-                speed.Process(obj)
-
-            aim_strain_timeline = [(x.Item1, x.Item2) for x in aim.StrainTimeline]
-            speed_strain_timeline = [(x.Item1, x.Item2) for x in speed.StrainTimeline]
-
-            sent = yield re_deserialize(difficulty_attributes, aim_strain_timeline=aim_strain_timeline, speed_strain_timeline=speed_strain_timeline)
+        # 额外处理：strain timeline，主模式依赖 strainTimeline patch，其他模式使用分段峰值
+        if strain_timeline:
+            with stage(metrics, "strain_timeline"):
+                strain_timelines = collect_strain_timelines(difficulty_pass)
+            # 每个 skill 读取一次 timeline 或分段峰值
+            count_interop(metrics, "strain_timeline", len(strain_timelines))
+            with stage(metrics, "serialize"):
+                result = re_deserialize(difficulty_attributes, **strain_timelines)
         else:
-            sent = yield re_deserialize(difficulty_attributes)
-
-        performance_calculator = ruleset.CreatePerformanceCalculator()
+            with stage(metrics, "serialize"):
+                result = re_deserialize(difficulty_attributes)
+        count_interop(metrics, "serialize")
+        sent = yield result
+
+        with stage(metrics, "summarize"):
+            summary = summarize_beatmap(beatmap, ruleset.RulesetInfo.OnlineID)
+        count(metrics, "hit_objects", summary.hit_object_count)
+        # 遍历每个谱面物件，再加上一次 GetMaxCombo
+        count_interop(metrics, "summarize", summary.hit_object_count + 1)
+        score_calculator = ScoreCalculator(ruleset, working_beatmap.BeatmapInfo, mod_array)
         while sent:
-            hit_results = generate_hit_result(sent, beatmap, mod_array)
-
-            score_info = ScoreInfo()
-            score_info.BeatmapInfo = working_beatmap.BeatmapInfo
-            score_info.Ruleset = ruleset.RulesetInfo
-            score_info.Accuracy = get_accuracy(sent, beatmap, hit_results, mod_array)
-            score_info.MaxCombo = sent.combo if hasattr(sent, "combo") and sent.combo is not None else BeatmapExtensions.GetMaxCombo(beatmap)
-
-            # 这里要把 Python 字典转换为 C# 字典，同时排除个人新增的一些键
-            net_statistics = Dictionary[HitResult, int]()
-            for k, v in hit_results.items():
-                if k not in ["large_tick_hits"]:
-                    net_statistics[k] = v
-            score_info.Statistics = net_statistics
-            score_info.Mods = mod_array
-
-            performance_attributes = performance_calculator.Calculate(score_info, difficulty_attributes)
-
-            sent = yield re_deserialize(performance_attributes)
+            score_count = len(sent) if isinstance(sent, list) else 1
+            count(metrics, "scores", score_count)
+            with stage(metrics, "performance"):
+                response = score_calculator.respond(sent, beatmap, summary, difficulty_attributes)
+            # 每个成绩一次 Calculate，整批一次序列化
+            count_interop(metrics, "performance", score_count + 1)
+            sent = yield response
 
     return re_deserialize(working_beatmap.BeatmapInfo)
 
@@ -462,69 +704,109 @@ def calculate_osu_performance(
     beatmap_path: str,
     mods: Optional[list[str]] = None,
     mod_options: Optional[list[str]] = None,
-) -> Generator[Result, Optional[OsuPerformance], Result]:
+    *,
+    timeout: Optional[float] = None,
+) -> Generator[Union[Result, list[Result]], Union[OsuPerformance, list[OsuPerformance], None], Result]:
     """生成器模式的 osu! performance 计算器，在多次计算同一谱面时只需要创建一次计算器，提高效率
 
     第一次返回 ``difficulty_attributes``
 
     后续每次传入 ``OsuPerformance`` 返回 ``performance_attributes``
 
-    传入 ``None`` 则结束计算
+    传入 ``OsuPerformance`` 的列表则一次返回对应的 ``performance_attributes`` 列表，适合批量计算同一谱面的多个成绩
+
+    传入 ``None`` 或空列表则结束计算
+
+    ``timeout`` 为难度计算的秒数上限，超时后返回的结果均为空，并带有 ``__ek_cancelled`` 标记；
+    谱面超出 ``max_hit_objects`` / ``max_slider_length`` 配置时结果均为空，并带有 ``__ek_rejected`` 标记
 
     生成器结束返回 ``beatmap_info``
     """
-    return calculate_performance(beatmap_path, OsuRuleset(), mods, mod_options, strain_timeline=True)
+    return calculate_performance(beatmap_path, get_ruleset(0), mods, mod_options, strain_timeline=True, timeout=timeout)
 
 
 def calculate_taiko_performance(
     beatmap_path: str,
     mods: Optional[list[str]] = None,
     mod_options: Optional[list[str]] = None,
-) -> Generator[Result, Optional[TaikoPerformance], Result]:
+    *,
+    timeout: Optional[float] = None,
+    strain_timeline: bool = False,
+) -> Generator[Union[Result, list[Result]], Union[TaikoPerformance, list[TaikoPerformance], None], Result]:
     """生成器模式的 osu!taiko performance 计算器，在多次计算同一谱面时只需要创建一次计算器，提高效率
 
     第一次返回 ``difficulty_attributes``
 
     后续每次传入 ``TaikoPerformance`` 返回 ``performance_attributes``
 
-    传入 ``None`` 则结束计算
+    传入 ``TaikoPerformance`` 的列表则一次返回对应的 ``performance_attributes`` 列表，适合批量计算同一谱面的多个成绩
+
+    传入 ``None`` 或空列表则结束计算
+
+    ``timeout`` 为难度计算的秒数上限，超时后返回的结果均为空，并带有 ``__ek_cancelled`` 标记；
+    谱面超出 ``max_hit_objects`` / ``max_slider_length`` 配置时结果均为空，并带有 ``__ek_rejected`` 标记
+
+    ``strain_timeline`` 为 ``True`` 时 ``difficulty_attributes`` 额外带有各 skill 的 ``*_strain_timeline``（分段峰值），
+    此时通过反射复用难度计算的 skill 实例，每个难度物件对每个 skill 各有一次 .NET 调用，难度计算明显变慢，默认不启用
 
     生成器结束返回 ``beatmap_info``
     """
-    return calculate_performance(beatmap_path, TaikoRuleset(), mods, mod_options)
+    return calculate_performance(beatmap_path, get_ruleset(1), mods, mod_options, strain_timeline=strain_timeline, timeout=timeout)
 
 
 def calculate_catch_performance(
     beatmap_path: str,
     mods: Optional[list[str]] = None,
     mod_options: Optional[list[str]] = None,
-) -> Generator[Result, Optional[CatchPerformance], Result]:
+    *,
+    timeout: Optional[float] = None,
+    strain_timeline: bool = False,
+) -> Generator[Union[Result, list[Result]], Union[CatchPerformance, list[CatchPerformance], None], Result]:
     """生成器模式的 osu!catch performance 计算器，在多次计算同一谱面时只需要创建一次计算器，提高效率
 
     第一次返回 ``difficulty_attributes``
 
     后续每次传入 ``CatchPerformance`` 返回 ``performance_attributes``
 
-    传入 ``None`` 则结束计算
+    传入 ``CatchPerformance`` 的列表则一次返回对应的 ``performance_attributes`` 列表，适合批量计算同一谱面的多个成绩
+
+    传入 ``None`` 或空列表则结束计算
+
+    ``timeout`` 为难度计算的秒数上限，超时后返回的结果均为空，并带有 ``__ek_cancelled`` 标记；
+    谱面超出 ``max_hit_objects`` / ``max_slider_length`` 配置时结果均为空，并带有 ``__ek_rejected`` 标记
+
+    ``strain_timeline`` 为 ``True`` 时 ``difficulty_attributes`` 额外带有各 skill 的 ``*_strain_timeline``（分段峰值），
+    此时通过反射复用难度计算的 skill 实例，每个难度物件对每个 skill 各有一次 .NET 调用，难度计算明显变慢，默认不启用
 
     生成器结束返回 ``beatmap_info``
     """
-    return calculate_performance(beatmap_path, CatchRuleset(), mods, mod_options)
+    return calculate_performance(beatmap_path, get_ruleset(2), mods, mod_options, strain_timeline=strain_timeline, timeout=timeout)
 
 
 def calculate_mania_performance(
     beatmap_path: str,
     mods: Optional[list[str]] = None,
     mod_options: Optional[list[str]] = None,
-) -> Generator[Result, Optional[ManiaPerformance], Result]:
+    *,
+    timeout: Optional[float] = None,
+    strain_timeline: bool = False,
+) -> Generator[Union[Result, list[Result]], Union[ManiaPerformance, list[ManiaPerformance], None], Result]:
     """生成器模式的 osu!mania performance 计算器，在多次计算同一谱面时只需要创建一次计算器，提高效率
 
     第一次返回 ``difficulty_attributes``
 
     后续每次传入 ``ManiaPerformance`` 返回 ``performance_attributes``
 
-    传入 ``None`` 则结束计算
+    传入 ``ManiaPerformance`` 的列表则一次返回对应的 ``performance_attributes`` 列表，适合批量计算同一谱面的多个成绩
+
+    传入 ``None`` 或空列表则结束计算
+
+    ``timeout`` 为难度计算的秒数上限，超时后返回的结果均为空，并带有 ``__ek_cancelled`` 标记；
+    谱面超出 ``max_hit_objects`` / ``max_slider_length`` 配置时结果均为空，并带有 ``__ek_rejected`` 标记
+
+    ``strain_timeline`` 为 ``True`` 时 ``difficulty_attributes`` 额外带有各 skill 的 ``*_strain_timeline``（分段峰值），
+    此时通过反射复用难度计算的 skill 实例，每个难度物件对每个 skill 各有一次 .NET 调用，难度计算明显变慢，默认不启用
 
     生成器结束返回 ``beatmap_info``
     """
-    return calculate_performance(beatmap_path, ManiaRuleset(), mods, mod_options)
+    return calculate_performance(beatmap_path, get_ruleset(3), mods, mod_options, strain_timeline=strain_timeline, timeout=timeout)
@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .core import Array, BindingFlags, CancellationToken, CancellationTokenSource, IBeatmap, JsonConvert, Mod, ModUtils, Ruleset, System, TimeSpan
+from .util import StrainTimeline, convert_strain_timeline, format_strain_timeline, json_numbers_to_array, to_snake_case
+
+# 难度计算器中 CreateSkills 等成员是 protected 的，只能通过反射调用，MethodInfo / PropertyInfo 按 (Python 类型, 成员名) 缓存
+_METHOD_CACHE: dict[tuple[type, str], object] = {}
+_PROPERTY_CACHE: dict[tuple[type, str], object] = {}
+# 每处理这么多个物件检查一次取消，避免每个物件都跨边界读取 token
+_CANCELLATION_CHECK_INTERVAL = 64
+
+
+def invoke_non_public(obj, name: str, *args):
+    key = (type(obj), name)
+    method = _METHOD_CACHE.get(key)
+    if method is None:
+        method = obj.GetType().GetMethod(name, BindingFlags.Instance | BindingFlags.Public | BindingFlags.NonPublic)
+        if method is None:
+            raise AttributeError(f"{obj.GetType().FullName} has no method {name}")
+        _METHOD_CACHE[key] = method
+    # DoNotWrapExceptions 保证 OperationCanceledException 等异常不会被包装成 TargetInvocationException
+    return method.Invoke(obj, BindingFlags.DoNotWrapExceptions, None, Array[System.Object](list(args)), None)
+
+
+def get_non_public(obj, name: str):
+    key = (type(obj), name)
+    prop = _PROPERTY_CACHE.get(key)
+    if prop is None:
+        prop = obj.GetType().GetProperty(name, BindingFlags.Instance | BindingFlags.Public | BindingFlags.NonPublic)
+        if prop is None:
+            raise AttributeError(f"{obj.GetType().FullName} has no property {name}")
+        _PROPERTY_CACHE[key] = prop
+    return prop.GetValue(obj)
+
+
+@contextmanager
+def time_budget(timeout: Optional[float], cancellation_token: Optional[CancellationToken] = None):
+    """把秒数上限与已有的 token 合并为一个 token，没有 ``timeout`` 时原样返回 ``cancellation_token``"""
+    if timeout is None:
+        yield cancellation_token
+        return
+    if cancellation_token is None:
+        token_source = CancellationTokenSource()
+    else:
+        token_source = CancellationTokenSource.CreateLinkedTokenSource(cancellation_token)
+    token_source.CancelAfter(TimeSpan.FromSeconds(timeout))
+    try:
+        yield token_source.Token
+    finally:
+        token_source.Dispose()
+
+
+def get_playable_beatmap(working_beatmap, ruleset: Ruleset, mod_array: Array[Mod], cancellation_token: Optional[CancellationToken] = None) -> IBeatmap:
+    # 与 DifficultyCalculator 一致，只有显式传入 token 时才替换谱面转换的默认超时
+    if cancellation_token is None:
+        return working_beatmap.GetPlayableBeatmap(ruleset.RulesetInfo, mod_array)
+    return working_beatmap.GetPlayableBeatmap(ruleset.RulesetInfo, mod_array, cancellation_token)
+
+
+def clone_mods(mod_array: Array[Mod]) -> Array[Mod]:
+    """与 ``DifficultyCalculator.Calculate`` 一样复制每个模组，``parse_mods`` 返回的缓存数组不能直接交给谱面转换和 skill
+
+    例如 RD 会在谱面转换时把随机种子写入模组，不复制就会带到之后的计算和其他调用中
+    """
+    return Array[Mod]([mod.DeepClone() for mod in mod_array])
+
+
+class DifficultyPass(NamedTuple):
+    attributes: object
+    skills: object
+    clock_rate: float
+    # 第一个难度物件的 StartTime（已按 clock rate 缩放），没有物件时为 None
+    start_time: Optional[float] = None
+    # 本次计算发出的 .NET 调用次数，供 CallMetrics 统计
+    interop_calls: int = 0
+
+
+def calculate_with_skills(calculator, beatmap: IBeatmap, mod_array: Array[Mod], cancellation_token: Optional[CancellationToken] = None) -> DifficultyPass:
+    """在 Python 侧复现 ``DifficultyCalculator.Calculate``，返回难度属性的同时保留计算时使用的 skill 实例
+
+    ``beatmap`` 必须是由同一个 ``mod_array`` 得到的 playable beatmap，``mod_array`` 应当是 ``clone_mods`` 复制后的数组，
+    结果与 ``Calculate`` 一致，strain 只计算一次
+
+    物件遍历在 Python 中进行，每个难度物件对每个 skill 各有一次 .NET 调用，因此比 ``Calculate`` 慢，
+    代价随物件数线性增长，可以用 ``benchmarks/run_benchmarks.py`` 的 ``difficulty`` 与 ``difficulty_skills`` 阶段对比
+    """
+    clock_rate = ModUtils.CalculateRateWithMods(mod_array)
+    skills = invoke_non_public(calculator, "CreateSkills", beatmap, mod_array, clock_rate)
+    start_time = None
+    # CreateSkills 和 CreateDifficultyAttributes
+    interop_calls = 2
+
+    if beatmap.HitObjects.Count > 0:
+        objects = invoke_non_public(calculator, "SortObjects", invoke_non_public(calculator, "CreateDifficultyHitObjects", beatmap, clock_rate))
+        interop_calls += 2
+        object_count = 0
+        for i, obj in enumerate(objects):
+            if i == 0:
+                start_time = obj.StartTime
+            if cancellation_token is not None and i % _CANCELLATION_CHECK_INTERVAL == 0:
+                cancellation_token.ThrowIfCancellationRequested()
+            for skill in skills:
+                skill.Process(obj)
+            object_count += 1
+        # 每个物件一次枚举，加上每个 skill 一次 Process
+        interop_calls += object_count * (1 + len(skills))
+
+    attributes = invoke_non_public(calculator, "CreateDifficultyAttributes", beatmap, mod_array, skills, clock_rate)
+    return DifficultyPass(attributes, skills, clock_rate, start_time, interop_calls)
+
+
+def create_progressive_beatmap(calculator, beatmap: IBeatmap):
+    """创建 ``DifficultyCalculator`` 内部用于 ``CalculateTimed`` 的 ``ProgressiveCalculationBeatmap``
+
+    返回 (``IBeatmap`` 视图, 可追加物件的 ``HitObjects`` 列表)，谱面的其余属性均来自 ``beatmap``
+    """
+    calculator_type = calculator.GetType()
+    while calculator_type.Name != "DifficultyCalculator":
+        calculator_type = calculator_type.BaseType
+    progressive_type = calculator_type.GetNestedType("ProgressiveCalculationBeatmap", BindingFlags.NonPublic)
+    progressive = System.Activator.CreateInstance(progressive_type, Array[System.Object]([beatmap]))
+    hit_objects = progressive_type.GetField("HitObjects").GetValue(progressive)
+    return IBeatmap(progressive), hit_objects
+
+
+def strain_peaks_to_timeline(skill, start_time: Optional[float]) -> StrainTimeline:
+    """将 ``StrainSkill.GetCurrentStrainPeaks`` 的分段峰值转换为 (time, strain) 数组
+
+    每段的时间取该段的结束时间，与 ``DifficultyHitObject.StartTime`` 一样已经按 clock rate 缩放
+    """
+    strain = json_numbers_to_array(JsonConvert.SerializeObject(skill.GetCurrentStrainPeaks()))
+    if start_time is None:
+        return StrainTimeline(np.zeros(0, dtype=np.float64), strain[:0])
+    section_length = get_non_public(skill, "SectionLength")
+    first_section_end = np.ceil(start_time / section_length) * section_length
+    time = first_section_end + section_length * np.arange(len(strain), dtype=np.float64)
+    return StrainTimeline(time, strain)
+
+
+def collect_strain_timelines(difficulty_pass: DifficultyPass) -> dict[str, StrainTimeline | list[tuple[float, float]]]:
+    """从难度计算使用的 skill 实例中收集 strain timeline，键名为 ``<skill>_strain_timeline``
+
+    打了 strainTimeline patch 的 skill 直接读取 ``StrainTimeline``，其余 strain skill 使用分段峰值，
+    同一类型的 skill 出现多次时从第二个开始加上序号后缀，例如 osu! 中不计滑条的 Aim 为 ``aim_2``
+    """
+    timelines = {}
+    for skill in difficulty_pass.skills:
+        if hasattr(skill, "StrainTimeline"):
+            timeline = convert_strain_timeline(skill.StrainTimeline)
+        elif hasattr(skill, "GetCurrentStrainPeaks"):
+            timeline = format_strain_timeline(strain_peaks_to_timeline(skill, difficulty_pass.start_time))
+        else:
+            continue
+        name = to_snake_case(skill.GetType().Name)
+        key = "%s_strain_timeline" % name
+        index = 1
+        while key in timelines:
+            index += 1
+            key = "%s_%d_strain_timeline" % (name, index)
+        timelines[key] = timeline
+    return timelines
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from typing import Literal, NamedTuple, Optional
+
+from . import core
+from .core import Array, Mod, ProcessorCommand, Ruleset
+from .store import canonicalize_mods
+
+_RULESET_TYPES = {0: "OsuRuleset", 1: "TaikoRuleset", 2: "CatchRuleset", 3: "ManiaRuleset"}
+# 每个线程最多缓存的模组组合数量
+_MOD_CACHE_MAXSIZE = 256
+# ruleset 和解析后的模组都按线程缓存，不同线程之间不共享 .NET 对象
+_LOCAL = threading.local()
+
+
+class ModSetKey(NamedTuple):
+    """模组组合的缓存键，模组和设置都已排序，与书写顺序无关"""
+
+    ruleset_id: int
+    mods: tuple[str, ...]
+    mod_options: tuple[str, ...]
+
+
+class _ModEntry:
+    __slots__ = ("mod_array", "canonical")
+
+    def __init__(self, mod_array: Array[Mod]):
+        self.mod_array = mod_array
+        self.canonical: Optional[str] = None
+
+
+def _local_caches() -> tuple[dict[int, Ruleset], OrderedDict[ModSetKey, _ModEntry]]:
+    caches = getattr(_LOCAL, "caches", None)
+    if caches is None:
+        caches = _LOCAL.caches = ({}, OrderedDict())
+    return caches
+
+
+def get_ruleset(ruleset_id: Literal[0, 1, 2, 3]) -> Ruleset:
+    """返回当前线程的 ruleset 单例，只加载对应模式的程序集"""
+    rulesets, _ = _local_caches()
+    ruleset = rulesets.get(ruleset_id)
+    if ruleset is None:
+        ruleset = rulesets[ruleset_id] = getattr(core, _RULESET_TYPES[ruleset_id])()
+    return ruleset
+
+
+def mod_set_key(ruleset_id: int, mods: Optional[list[str]] = None, mod_options: Optional[list[str]] = None) -> ModSetKey:
+    return ModSetKey(ruleset_id, tuple(sorted(mods or ())), tuple(sorted(mod_options or ())))
+
+
+def _get_entry(ruleset_id: int, mods: Optional[list[str]], mod_options: Optional[list[str]]) -> _ModEntry:
+    _, mod_cache = _local_caches()
+    key = mod_set_key(ruleset_id, mods, mod_options)
+    entry = mod_cache.get(key)
+    if entry is not None:
+        mod_cache.move_to_end(key)
+        return entry
+    mod_array = ProcessorCommand.ParseMods(get_ruleset(ruleset_id), Array[str](list(key.mods)), Array[str](list(key.mod_options)))
+    entry = mod_cache[key] = _ModEntry(mod_array)
+    if len(mod_cache) > _MOD_CACHE_MAXSIZE:
+        mod_cache.popitem(last=False)
+    return entry
+
+
+def parse_mods(ruleset_id: int, mods: Optional[list[str]] = None, mod_options: Optional[list[str]] = None) -> Array[Mod]:
+    """带缓存的 ``ProcessorCommand.ParseMods``
+
+    返回的数组在同一线程的多次调用之间共享，不能修改；``DifficultyCalculator.Calculate`` 和 performance 计算器只读取或自行复制模组，可以直接传入，
+    但谱面转换（``get_playable_beatmap``）、``calculate_with_skills`` 等会修改模组状态的调用必须先用 ``pipeline.clone_mods`` 复制
+    """
+    return _get_entry(ruleset_id, mods, mod_options).mod_array
+
+
+def canonical_mods(ruleset_id: int, mods: Optional[list[str]] = None, mod_options: Optional[list[str]] = None) -> str:
+    """模组组合的规范化字符串（同 ``store.canonicalize_mods``），等价的写法得到相同的结果，可用作调用方自己的缓存键"""
+    entry = _get_entry(ruleset_id, mods, mod_options)
+    if entry.canonical is None:
+        entry.canonical = canonicalize_mods(entry.mod_array)
+    return entry.canonical
+
+
+def clear_registry():
+    """清空当前线程的 ruleset 和模组缓存"""
+    rulesets, mod_cache = _local_caches()
+    rulesets.clear()
+    mod_cache.clear()
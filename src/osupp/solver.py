@@ -0,0 +1,127 @@
+from collections.abc import Generator
+from typing import NamedTuple, Optional, Union
+
+from .performance import BeatmapSummary, CatchPerformance, ManiaPerformance, OsuPerformance, TaikoPerformance
+from .util import Result
+
+Performance = Union[OsuPerformance, TaikoPerformance, CatchPerformance, ManiaPerformance]
+
+# 这些字段不为 None 时 hit result 直接由数量决定，accuracy_percent 不再生效
+_ACCURACY_OVERRIDING_FIELDS = ("mehs", "oks", "goods", "greats")
+# 各模式 hit result 估计仍然有效且 pp 随准确率单调的最低准确率 (%)
+# osu! 低于 1/6 时只剩 50 也无法凑出准确率，估计退化为几乎全是 300；taiko 低于 50% 时 300 的数量为负
+# catch 和 mania 的估计在整个 [0, 100] 上都单调
+_MIN_ACCURACY_PERCENT = {OsuPerformance: 100.0 / 6, TaikoPerformance: 50.0}
+
+
+class SolveResult(NamedTuple):
+    # 满足目标的成绩，无法达到目标时为搜索范围内 pp 最高的成绩
+    performance: Performance
+    performance_attributes: Result
+    # 是否能达到目标 pp
+    reachable: bool
+    # 本次求解实际发送给计算器的成绩数量（不含缓存命中）
+    evaluations: int
+
+
+class PerformanceSolver:
+    """在 performance 生成器之上求解达到目标 pp 所需的准确率或最多能接受的 miss 数
+
+    ``calculator`` 必须是已经取出 ``difficulty_attributes`` 的 ``calculate_*_performance`` 生成器，
+    求解过程只通过 ``send`` 计算 pp，所有计算过的成绩都会缓存，多次求解同一谱面时可以复用
+
+    ``summary`` 为同一谱面和模组的 ``summarize_beatmap`` 结果，用于确定 miss 数的上限
+    """
+
+    def __init__(self, calculator: Generator, difficulty_attributes: Optional[Result] = None, summary: Optional[BeatmapSummary] = None):
+        self.calculator = calculator
+        self.difficulty_attributes = difficulty_attributes
+        self.summary = summary
+        self._cache: dict[Performance, Result] = {}
+        self._evaluations = 0
+
+    def evaluate_many(self, perfs: list[Performance]) -> list[Result]:
+        missing = list(dict.fromkeys(perf for perf in perfs if perf not in self._cache))
+        if missing:
+            self._evaluations += len(missing)
+            for perf, performance_attributes in zip(missing, self.calculator.send(missing)):
+                self._cache[perf] = performance_attributes
+        return [self._cache[perf] for perf in perfs]
+
+    def evaluate(self, perf: Performance) -> Result:
+        return self.evaluate_many([perf])[0]
+
+    def solve_accuracy(self, target_pp: float, perf: Performance, *, tolerance: float = 0.01, max_evaluations: int = 32) -> SolveResult:
+        """在 ``perf`` 的其余条件（miss 数、combo 等）不变时，求达到 ``target_pp`` 的最低 ``accuracy_percent``
+
+        pp 在各模式的有效范围内随准确率单调不减，先检查 [下限, 100] 两端，再用 Illinois 修正的试位法收缩区间，区间宽度小于 ``tolerance`` 时停止；
+        下限为 osu! 1/6、taiko 50%，其余模式 0%，目标低于下限处的 pp 时返回下限
+        """
+        if any(getattr(perf, field, None) is not None for field in _ACCURACY_OVERRIDING_FIELDS):
+            raise ValueError("hit counts in perf override accuracy_percent")
+        start = self._evaluations
+
+        min_accuracy = _MIN_ACCURACY_PERCENT.get(type(perf), 0.0)
+        lo_perf, hi_perf = perf._replace(accuracy_percent=min_accuracy), perf._replace(accuracy_percent=100.0)
+        lo_attributes, hi_attributes = self.evaluate_many([lo_perf, hi_perf])
+        if hi_attributes["pp"] < target_pp:
+            return SolveResult(hi_perf, hi_attributes, False, self._evaluations - start)
+        if lo_attributes["pp"] >= target_pp:
+            return SolveResult(lo_perf, lo_attributes, True, self._evaluations - start)
+
+        # 始终保持 f(lo) < 0 <= f(hi)
+        lo, hi = min_accuracy, 100.0
+        f_lo, f_hi = lo_attributes["pp"] - target_pp, hi_attributes["pp"] - target_pp
+        side = 0
+        while hi - lo > tolerance and self._evaluations - start < max_evaluations:
+            accuracy = (lo * f_hi - hi * f_lo) / (f_hi - f_lo)
+            # pp 是关于 hit result 数量的阶梯函数，插值点贴近端点时退化为二分
+            if not lo + tolerance / 4 < accuracy < hi - tolerance / 4:
+                accuracy = (lo + hi) / 2
+            mid_perf = perf._replace(accuracy_percent=accuracy)
+            mid_attributes = self.evaluate(mid_perf)
+            f_mid = mid_attributes["pp"] - target_pp
+            if f_mid >= 0:
+                hi, f_hi, hi_perf, hi_attributes = accuracy, f_mid, mid_perf, mid_attributes
+                if side == 1:
+                    f_lo /= 2
+                side = 1
+            else:
+                lo, f_lo = accuracy, f_mid
+                if side == -1:
+                    f_hi /= 2
+                side = -1
+        return SolveResult(hi_perf, hi_attributes, True, self._evaluations - start)
+
+    def solve_misses(self, target_pp: float, perf: Performance, *, max_misses: Optional[int] = None) -> SolveResult:
+        """在 ``perf`` 的其余条件不变时，求仍能达到 ``target_pp`` 的最多 miss 数
+
+        pp 随 miss 数单调不增，在 [``perf.misses``, ``max_misses``] 上二分，
+        ``max_misses`` 默认取 ``difficulty_attributes`` 的 ``max_combo``；osu! 的 ``max_combo`` 包含滑条的 tick 和尾，
+        比物件数多，超出物件数的 miss 数会使 300 的数量为负，因此提供 ``summary`` 时不超过物件数（减去指定的 100 和 50）
+        """
+        start = self._evaluations
+        if max_misses is None:
+            if self.difficulty_attributes is None:
+                raise ValueError("max_misses is required when difficulty_attributes is not given")
+            max_misses = int(self.difficulty_attributes["max_combo"])
+            if self.summary is not None and isinstance(perf, OsuPerformance):
+                max_misses = min(max_misses, self.summary.hit_object_count - (perf.oks or 0) - (perf.mehs or 0))
+
+        lo = perf.misses
+        lo_perf = perf
+        lo_attributes = self.evaluate(lo_perf)
+        if lo_attributes["pp"] < target_pp:
+            return SolveResult(lo_perf, lo_attributes, False, self._evaluations - start)
+
+        # 始终保持 pp(lo) >= target > pp(hi)
+        hi = max_misses + 1
+        while hi - lo > 1:
+            misses = (lo + hi) // 2
+            mid_perf = perf._replace(misses=misses)
+            mid_attributes = self.evaluate(mid_perf)
+            if mid_attributes["pp"] >= target_pp:
+                lo, lo_perf, lo_attributes = misses, mid_perf, mid_attributes
+            else:
+                hi = misses
+        return SolveResult(lo_perf, lo_attributes, True, self._evaluations - start)
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+from orjson import OPT_SORT_KEYS, dumps, loads
+
+from .config import current_config
+from .core import APIMod, Array, JsonConvert, Mod, Ruleset
+from .util import Result, beatmap_md5
+
+
+class StoreKey(NamedTuple):
+    beatmap_md5: str
+    ruleset_id: int
+    mods: str
+    version: str
+
+
+def canonicalize_mods(mod_array: Array[Mod]) -> str:
+    """将 ``ProcessorCommand.ParseMods`` 得到的模组数组转换为规范化的字符串
+
+    经过 ``APIMod`` 序列化后只保留非默认值的设置，且设置值已经被解析为真实类型，
+    因此 ``DT_adjust_pitch=true`` 与 ``DT_adjust_pitch=1`` 等写法会得到相同的结果
+    """
+    api_mods = [loads(JsonConvert.SerializeObject(APIMod(mod))) for mod in mod_array]
+    api_mods.sort(key=lambda m: m["acronym"])
+    return dumps(api_mods, option=OPT_SORT_KEYS).decode()
+
+
+def get_osu_version(ruleset: Ruleset) -> str:
+    return str(ruleset.GetType().Assembly.GetName().Version)
+
+
+class DifficultyStore:
+    """以 (谱面 MD5, 模式, 规范化模组, osu! 版本) 为键的难度属性持久化存储"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # 连接在线程间共享，所有读写都在锁内进行
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS difficulty_attributes ("
+            "beatmap_md5 TEXT NOT NULL, ruleset_id INTEGER NOT NULL, mods TEXT NOT NULL, version TEXT NOT NULL, attributes BLOB NOT NULL, "
+            "PRIMARY KEY (beatmap_md5, ruleset_id, mods, version))",
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(beatmap_path: str, ruleset: Ruleset, mods: Array[Mod] | str, file_md5: Optional[str] = None) -> StoreKey:
+        """``mods`` 可以是模组数组，也可以是已经规范化的字符串；同一谱面查询多次时可以传入预先算好的 ``file_md5``，避免重复读取文件"""
+        return StoreKey(file_md5 if file_md5 is not None else beatmap_md5(beatmap_path), ruleset.RulesetInfo.OnlineID, mods if isinstance(mods, str) else canonicalize_mods(mods), get_osu_version(ruleset))
+
+    def get(self, key: StoreKey) -> Optional[Result]:
+        with self._lock:
+            row = self._conn.execute("SELECT attributes FROM difficulty_attributes WHERE beatmap_md5 = ? AND ruleset_id = ? AND mods = ? AND version = ?", key).fetchone()
+        if row is None:
+            return None
+        return Result(loads(row[0]))
+
+    def put(self, key: StoreKey, attributes: Result):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO difficulty_attributes VALUES (?, ?, ?, ?, ?)", (*key, dumps(attributes._get_pure())))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_STORES: dict[str, DifficultyStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_difficulty_store() -> Optional[DifficultyStore]:
+    """返回 ``difficulty_store`` 配置对应的存储，未配置时返回 ``None``"""
+    path = current_config()["difficulty_store"]
+    if path is None:
+        return None
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = DifficultyStore(path)
+        return _STORES[path]
@@ -1,8 +1,20 @@
+import math
 import re
+from collections.abc import Iterable, Mapping
+from functools import lru_cache
+from hashlib import md5
+from typing import NamedTuple, Optional
 
+import numpy as np
 from orjson import loads
 
-from .core import JsonConvert
+from .config import current_config
+from .core import JsonConvert, JsonObjectContract, JsonSerializer, NullValueHandling
+
+# 可以直接读取且与 JSON 序列化结果完全一致的属性类型，float 和 decimal 的 JSON 表示与 Python 的 float 不同，不在此列
+_FAST_PROPERTY_TYPES = {"System.Double", "System.Int32", "System.Int64", "System.Boolean", "System.String"}
+# 按 Python 侧的类型缓存 (JSON 键名, CLR 成员名, ShouldSerialize 委托, 是否忽略 null)，None 表示该类型只能走 JSON
+_PROPERTY_CACHE: dict[type, Optional[list[tuple]]] = {}
 
 
 class Result(dict):
@@ -16,10 +28,279 @@ class Result(dict):
         return {k: v for k, v in self.items() if not k.startswith("__ek_")}
 
 
+class _CompactKeys:
+    """同一键集合的所有 ``CompactResult`` 共享的键名和下标"""
+
+    __slots__ = ("fields", "index")
+
+    def __init__(self, fields: tuple[str, ...]):
+        self.fields = fields
+        self.index = {k: i for i, k in enumerate(fields)}
+
+
+@lru_cache(maxsize=None)
+def _compact_keys(fields: tuple[str, ...]) -> _CompactKeys:
+    return _CompactKeys(fields)
+
+
+class CompactResult:
+    """紧凑版的 ``Result``，值按顺序存放在 tuple 中，键名和下标由同一键集合的所有实例共享
+
+    按只读映射使用：迭代得到键名，``==`` 与 ``Result`` / dict 一样比较键和值，不存在的键返回 0.0；
+    序列化时先调用 ``to_dict``，例如 ``orjson.dumps(result, default=CompactResult.to_dict)``
+    """
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, fields: Iterable[str], values: Iterable):
+        self._keys = _compact_keys(tuple(fields))
+        self._values = tuple(values)
+        if len(self._values) != len(self._keys.fields):
+            raise ValueError("fields and values must have the same length")
+
+    def __getitem__(self, key):
+        index = self._keys.index.get(key)
+        if index is None:
+            return 0.0
+        return self._values[index]
+
+    def __contains__(self, key):
+        return key in self._keys.index
+
+    def __iter__(self):
+        return iter(self._keys.fields)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactResult):
+            if self._keys is other._keys:
+                return self._values == other._values
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((self._keys.fields, self._values))
+
+    def __reduce__(self):
+        return CompactResult, (self._keys.fields, self._values)
+
+    def __repr__(self):
+        return "CompactResult(%s)" % ", ".join("%s=%r" % item for item in self.items())
+
+    def keys(self) -> tuple[str, ...]:
+        return self._keys.fields
+
+    def values(self) -> tuple:
+        return self._values
+
+    def items(self):
+        return zip(self._keys.fields, self._values)
+
+    def get(self, key, default=None):
+        index = self._keys.index.get(key)
+        return default if index is None else self._values[index]
+
+    def _get_pure(self):
+        return {k: v for k, v in self.items() if not k.startswith("__ek_")}
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def to_result(self) -> Result:
+        return Result(self.items())
+
+
+# 注册为 Mapping，使 isinstance 检查和 dict(...) 等按映射处理
+Mapping.register(CompactResult)
+
+
+def compact(result: Result) -> CompactResult:
+    return CompactResult(result.keys(), result.values())
+
+
+class ResultColumns:
+    """按列存放一批结果，不保留逐行的 dict
+
+    ``to_numpy`` 返回的列字典可以直接交给 ``pyarrow.table`` 等列式工具
+    """
+
+    def __init__(self, include_extra: bool = False):
+        self.include_extra = include_extra
+        self._columns: dict[str, list] = {}
+        self._length = 0
+
+    @classmethod
+    def from_results(cls, results: Iterable[Result | CompactResult], include_extra: bool = False) -> "ResultColumns":
+        columns = cls(include_extra)
+        columns.extend(results)
+        return columns
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key: str) -> list:
+        return self._columns[key]
+
+    def keys(self):
+        return self._columns.keys()
+
+    def append(self, result: Result | CompactResult):
+        for key, value in result.items():
+            if not self.include_extra and key.startswith("__ek_"):
+                continue
+            column = self._columns.get(key)
+            if column is None:
+                # 新出现的键用 None 补齐之前的行
+                column = self._columns[key] = [None] * self._length
+            column.append(value)
+        self._length += 1
+        for column in self._columns.values():
+            if len(column) < self._length:
+                column.append(None)
+
+    def extend(self, results: Iterable[Result | CompactResult]):
+        for result in results:
+            self.append(result)
+
+    def to_numpy(self) -> dict[str, np.ndarray]:
+        """数值列转换为 int64 / float64（缺失值为 NaN），布尔列转换为 bool，其余为 object"""
+        arrays = {}
+        for key, column in self._columns.items():
+            present = [value for value in column if value is not None]
+            if present and all(isinstance(value, bool) for value in present) and len(present) == len(column):
+                arrays[key] = np.array(column, dtype=np.bool_)
+            elif present and all(isinstance(value, int) and not isinstance(value, bool) for value in present) and len(present) == len(column):
+                arrays[key] = np.array(column, dtype=np.int64)
+            elif present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                arrays[key] = np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+            else:
+                array = np.empty(len(column), dtype=object)
+                for i, value in enumerate(column):
+                    array[i] = value
+                arrays[key] = array
+        return arrays
+
+
+def _resolve_properties(obj) -> Optional[list[tuple]]:
+    serializer = JsonSerializer.CreateDefault()
+    contract = serializer.ContractResolver.ResolveContract(obj.GetType())
+    if not isinstance(contract, JsonObjectContract) or contract.ExtensionDataGetter is not None:
+        return None
+
+    global_ignore_null = serializer.NullValueHandling == NullValueHandling.Ignore
+    properties = []
+    for prop in contract.Properties:
+        if prop.Ignored or not prop.Readable:
+            continue
+        if prop.Converter is not None or prop.DefaultValueHandling is not None or prop.GetIsSpecified is not None:
+            return None
+        property_type = prop.PropertyType
+        if property_type.IsGenericType and property_type.GetGenericTypeDefinition().Name == "Nullable`1":
+            property_type = property_type.GetGenericArguments()[0]
+        if property_type.FullName not in _FAST_PROPERTY_TYPES:
+            return None
+        ignore_null = prop.NullValueHandling == NullValueHandling.Ignore if prop.NullValueHandling is not None else global_ignore_null
+        properties.append((prop.PropertyName, prop.UnderlyingName, prop.ShouldSerialize, ignore_null))
+    return properties
+
+
+def _to_json_value(value):
+    # Newtonsoft 默认将非有限浮点数写为字符串
+    if isinstance(value, float) and not math.isfinite(value):
+        return "NaN" if math.isnan(value) else ("Infinity" if value > 0 else "-Infinity")
+    return value
+
+
+def extract_properties(obj) -> Optional[dict]:
+    """按 Newtonsoft 的序列化契约直接读取属性，结果与 ``loads(JsonConvert.SerializeObject(obj))`` 相同
+
+    属性信息按类型缓存，含有非基本类型属性的类型返回 ``None``
+    """
+    obj_type = type(obj)
+    if obj_type not in _PROPERTY_CACHE:
+        _PROPERTY_CACHE[obj_type] = _resolve_properties(obj)
+    properties = _PROPERTY_CACHE[obj_type]
+    if properties is None:
+        return None
+
+    data = {}
+    for json_name, member_name, should_serialize, ignore_null in properties:
+        if should_serialize is not None and not should_serialize.Invoke(obj):
+            continue
+        value = getattr(obj, member_name)
+        if value is None and ignore_null:
+            continue
+        data[json_name] = _to_json_value(value)
+    return data
+
+
 def re_deserialize(obj, **kwargs):
-    return Result(loads(JsonConvert.SerializeObject(obj)), **{"__ek_%s" % k: v for k, v in kwargs.items()})
+    data = extract_properties(obj) if current_config()["fast_deserialize"] else None
+    if data is None:
+        data = loads(JsonConvert.SerializeObject(obj))
+    return Result(data, **{"__ek_%s" % k: v for k, v in kwargs.items()})
+
+
+def marked_result(**kwargs) -> Result:
+    """没有计算结果时返回的空结果，用 ``__ek_`` 键标记原因，例如 ``cancelled`` 和 ``rejected``"""
+    return Result({}, **{"__ek_%s" % k: v for k, v in kwargs.items()})
+
+
+def re_deserialize_many(objs) -> list[Result]:
+    """把 .NET 列表中的每个对象转换为 ``Result``
+
+    ``fast_deserialize`` 启用（默认）时逐个对象按 ``re_deserialize`` 直接读取属性，不经过 JSON；
+    关闭时整个列表只做一次 JSON 序列化，减少跨边界调用次数
+    """
+    if current_config()["fast_deserialize"]:
+        return [re_deserialize(obj) for obj in objs]
+    return [Result(obj) for obj in loads(JsonConvert.SerializeObject(objs))]
+
+
+class StrainTimeline(NamedTuple):
+    time: np.ndarray
+    strain: np.ndarray
+
+
+# 删除 JSON 中除数字和分隔符以外的字符，非有限浮点数被 Newtonsoft 写为 "NaN" 等字符串，去掉引号后 NumPy 可以直接解析
+_JSON_NUMBER_DELETE = str.maketrans("", "", '[]{}"')
+
+
+def json_numbers_to_array(text: str) -> np.ndarray:
+    """把只含数字的 JSON（数组或 ``Item1`` / ``Item2`` 对象数组）按出现顺序一次解析为 float64 数组，不创建中间的 Python 对象"""
+    return np.fromstring(text.translate(_JSON_NUMBER_DELETE).replace("Item1:", "").replace("Item2:", ""), dtype=np.float64, sep=",")
+
+
+def strain_timeline_to_arrays(timeline) -> StrainTimeline:
+    """一次序列化整个 .NET 的 (time, strain) 列表，再在一次扫描中解析为交错的 float64 数组，避免逐个元素跨边界访问"""
+    pairs = json_numbers_to_array(JsonConvert.SerializeObject(timeline)).reshape(-1, 2)
+    # 复制为两个连续数组，之后的切片和运算不受交错存放影响
+    return StrainTimeline(pairs[:, 0].copy(), pairs[:, 1].copy())
+
+
+def format_strain_timeline(timeline: StrainTimeline) -> StrainTimeline | list[tuple[float, float]]:
+    if current_config()["strain_timeline_as_tuples"]:
+        return list(zip(timeline.time.tolist(), timeline.strain.tolist()))
+    return timeline
+
+
+def convert_strain_timeline(timeline) -> StrainTimeline | list[tuple[float, float]]:
+    return format_strain_timeline(strain_timeline_to_arrays(timeline))
 
 
 def to_snake_case(name):
     s1 = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
     return re.sub("([a-z0-9])([A-Z])", r"\1_\2", s1).lower()
+
+
+def beatmap_md5(beatmap_path: str) -> str:
+    with open(beatmap_path, "rb") as fi_b:
+        return md5(fi_b.read()).hexdigest()
@@ -0,0 +1,352 @@
+import math
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .core import Array, HitResult, IBeatmap, Mod, ModClassic
+from .performance import BeatmapSummary, summarize_beatmap
+
+# 本模块是 performance 模块中 generate_*_hit_results 和 get_*_accuracy 的批量版本
+# 所有参数都可以是标量或数组，按 NumPy 规则广播，计算顺序与标量版本保持一致，保证结果逐位相同
+
+# 最多缓存的 mania hit result 表数量
+_MANIA_TABLE_CACHE_MAXSIZE = 256
+
+
+def _as_int_array(value: ArrayLike) -> NDArray[np.int64]:
+    return np.asarray(value, dtype=np.int64)
+
+
+def _optional_int_array(value: Optional[ArrayLike]) -> NDArray[np.int64]:
+    return _as_int_array(0 if value is None else value)
+
+
+def _round(value: NDArray[np.float64]) -> NDArray[np.int64]:
+    # np.rint 与 Python 的 round 一样是四舍六入五成双
+    return np.rint(value).astype(np.int64)
+
+
+# 标量版本的 ``x ** 2`` 调用 C 库的 pow，结果不一定正确舍入，而 NumPy 的平方会优化为乘法，约千分之一的输入会相差 1 ulp
+# 因此逐个调用同一个 pow，保证与标量版本逐位一致
+_POW = np.frompyfunc(math.pow, 2, 1)
+
+
+def _square(value: NDArray[np.float64]) -> NDArray[np.float64]:
+    return _POW(value, 2.0).astype(np.float64)
+
+
+def generate_osu_hit_results_array(
+    beatmap: IBeatmap,
+    accuracy: ArrayLike,
+    count_miss: ArrayLike = 0,
+    count_meh: Optional[ArrayLike] = None,
+    count_ok: Optional[ArrayLike] = None,
+    count_large_tick_misses: Optional[ArrayLike] = None,
+    count_slider_tail_misses: Optional[ArrayLike] = None,
+    *,
+    count_large_tick_hits: Optional[ArrayLike] = None,
+    count_slider_tail_hits: Optional[ArrayLike] = None,
+    summary: Optional[BeatmapSummary] = None,
+) -> dict[HitResult | str, NDArray[np.int64]]:
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 0)
+    accuracy, count_miss = np.broadcast_arrays(np.asarray(accuracy, dtype=np.float64), _as_int_array(count_miss))
+    total_result_count: int = summary.hit_object_count
+
+    if count_meh is not None or count_ok is not None:
+        count_ok = np.broadcast_to(_optional_int_array(count_ok), count_miss.shape)
+        count_meh = np.broadcast_to(_optional_int_array(count_meh), count_miss.shape)
+        count_great = total_result_count - count_ok - count_meh - count_miss
+    else:
+        relevant_result_count = total_result_count - count_miss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relevant_accuracy = np.where(relevant_result_count <= 0, 0.0, accuracy * total_result_count / relevant_result_count)
+        relevant_accuracy = np.clip(relevant_accuracy, 0.0, 1.0)
+
+        high = relevant_accuracy >= 0.25
+        middle = ~high & (relevant_accuracy >= 1.0 / 6)
+        low = ~high & ~middle
+
+        count_ok = np.zeros(count_miss.shape, dtype=np.int64)
+        count_meh = np.zeros(count_miss.shape, dtype=np.int64)
+
+        ratio_50_to_100 = _square(1 - (relevant_accuracy[high] - 0.25) / 0.75)
+        count_100_estimate = 6 * relevant_result_count[high] * (1 - relevant_accuracy[high]) / (5 * ratio_50_to_100 + 4)
+        count_50_estimate = count_100_estimate * ratio_50_to_100
+        count_ok[high] = _round(count_100_estimate)
+        count_meh[high] = _round(count_100_estimate + count_50_estimate) - count_ok[high]
+
+        count_100_estimate = 6 * relevant_result_count[middle] * relevant_accuracy[middle] - relevant_result_count[middle]
+        count_50_estimate = relevant_result_count[middle] - count_100_estimate
+        count_ok[middle] = _round(count_100_estimate)
+        count_meh[middle] = _round(count_100_estimate + count_50_estimate) - count_ok[middle]
+
+        count_50_estimate = 6 * relevant_result_count[low] * relevant_accuracy[low]
+        count_meh[low] = _round(count_50_estimate)
+
+        count_great = total_result_count - count_ok - count_meh - count_miss
+
+    result = {HitResult.Great: count_great, HitResult.Ok: count_ok, HitResult.Meh: count_meh, HitResult.Miss: count_miss}
+
+    if count_large_tick_misses is not None:
+        result[HitResult.LargeTickMiss] = np.broadcast_to(_as_int_array(count_large_tick_misses), count_miss.shape)
+
+    if count_slider_tail_misses is not None:
+        result[HitResult.SliderTailHit] = np.broadcast_to(summary.slider_count - _as_int_array(count_slider_tail_misses), count_miss.shape)
+
+    if count_large_tick_hits is not None:
+        result["large_tick_hits"] = np.broadcast_to(_as_int_array(count_large_tick_hits), count_miss.shape)
+    if count_slider_tail_hits is not None:
+        result[HitResult.SliderTailHit] = np.broadcast_to(_as_int_array(count_slider_tail_hits), count_miss.shape)
+
+    return result
+
+
+def get_osu_accuracy_array(beatmap: IBeatmap, statistics: dict[HitResult | str, NDArray[np.int64]], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None) -> NDArray[np.float64]:
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 0)
+    count_great = statistics[HitResult.Great]
+    count_ok = statistics[HitResult.Ok]
+    count_meh = statistics[HitResult.Meh]
+    count_miss = statistics[HitResult.Miss]
+    total = 6 * count_great + 2 * count_ok + count_meh
+    max_score = 6 * (count_great + count_ok + count_meh + count_miss)
+
+    if HitResult.SliderTailHit in statistics:
+        count_slider_tail_hit = statistics[HitResult.SliderTailHit]
+        count_sliders = summary.slider_count
+        total = total + 3 * count_slider_tail_hit
+        max_score = max_score + 3 * count_sliders
+
+    if HitResult.LargeTickMiss in statistics or "large_tick_hits" in statistics:
+        count_large_tick_miss = statistics.get(HitResult.LargeTickMiss, 0)
+        count_large_ticks = summary.large_tick_count
+        count_large_tick_hit = statistics.get("large_tick_hits", count_large_ticks - count_large_tick_miss)
+        total = total + 0.6 * count_large_tick_hit
+        max_score = max_score + 0.6 * count_large_ticks
+
+    return _safe_divide(total, max_score)
+
+
+def generate_taiko_hit_results_array(
+    beatmap: IBeatmap,
+    accuracy: ArrayLike,
+    count_miss: ArrayLike = 0,
+    count_ok: Optional[ArrayLike] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
+) -> dict[HitResult, NDArray[np.int64]]:
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 1)
+    accuracy, count_miss = np.broadcast_arrays(np.asarray(accuracy, dtype=np.float64), _as_int_array(count_miss))
+    total_result_count = summary.max_combo
+
+    if count_ok is not None:
+        count_ok = np.broadcast_to(_as_int_array(count_ok), count_miss.shape)
+        count_great = total_result_count - count_ok - count_miss
+    else:
+        target_total = _round(accuracy * total_result_count * 2)
+        count_great = target_total - (total_result_count - count_miss)
+        count_ok = total_result_count - count_great - count_miss
+
+    return {
+        HitResult.Great: count_great,
+        HitResult.Ok: count_ok,
+        HitResult.Meh: np.zeros(count_miss.shape, dtype=np.int64),
+        HitResult.Miss: count_miss,
+    }
+
+
+def get_taiko_accuracy_array(beatmap: IBeatmap, statistics: dict[HitResult, NDArray[np.int64]], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None) -> NDArray[np.float64]:
+    count_great = statistics[HitResult.Great]
+    count_ok = statistics[HitResult.Ok]
+    count_miss = statistics[HitResult.Miss]
+    total = count_great + count_ok + count_miss
+
+    return _safe_divide((2 * count_great) + count_ok, 2 * total)
+
+
+def generate_catch_hit_results_array(
+    beatmap: IBeatmap,
+    accuracy: ArrayLike,
+    count_miss: ArrayLike = 0,
+    count_small_tick_hit: Optional[ArrayLike] = None,
+    count_large_tick_hit: Optional[ArrayLike] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
+) -> dict[HitResult, NDArray[np.int64]]:
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 2)
+    accuracy, count_miss = np.broadcast_arrays(np.asarray(accuracy, dtype=np.float64), _as_int_array(count_miss))
+    max_combo = summary.max_combo
+    max_small_tick_hit = summary.tiny_droplet_count
+    max_large_tick_hit = summary.droplet_count
+    max_great = summary.fruit_count
+
+    if count_large_tick_hit is None:
+        count_large_tick_hit = np.maximum(0, max_large_tick_hit - count_miss)
+    else:
+        count_large_tick_hit = np.broadcast_to(_as_int_array(count_large_tick_hit), count_miss.shape)
+
+    count_great = max_great - (count_miss - (max_large_tick_hit - count_large_tick_hit))
+
+    if count_small_tick_hit is None:
+        count_small_tick_hit = _round(accuracy * (max_combo + max_small_tick_hit)) - count_great - count_large_tick_hit
+    else:
+        count_small_tick_hit = np.broadcast_to(_as_int_array(count_small_tick_hit), count_miss.shape)
+
+    count_small_tick_miss = max_small_tick_hit - count_small_tick_hit
+
+    return {
+        HitResult.Great: count_great,
+        HitResult.LargeTickHit: count_large_tick_hit,
+        HitResult.SmallTickHit: count_small_tick_hit,
+        HitResult.SmallTickMiss: count_small_tick_miss,
+        HitResult.Miss: count_miss,
+    }
+
+
+def get_catch_accuracy_array(beatmap: IBeatmap, statistics: dict[HitResult, NDArray[np.int64]], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None) -> NDArray[np.float64]:
+    hits = statistics[HitResult.Great] + statistics[HitResult.LargeTickHit] + statistics[HitResult.SmallTickHit]
+    total = hits + statistics[HitResult.Miss] + statistics[HitResult.SmallTickMiss]
+
+    return _safe_divide(hits, total)
+
+
+def generate_mania_hit_results_array(
+    beatmap: IBeatmap,
+    mods: Array[Mod],
+    accuracy: ArrayLike,
+    count_miss: ArrayLike = 0,
+    count_meh: Optional[ArrayLike] = None,
+    count_ok: Optional[ArrayLike] = None,
+    count_good: Optional[ArrayLike] = None,
+    count_great: Optional[ArrayLike] = None,
+    *,
+    summary: Optional[BeatmapSummary] = None,
+) -> dict[HitResult, NDArray[np.int64]]:
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 3)
+    accuracy, count_miss = np.broadcast_arrays(np.asarray(accuracy, dtype=np.float64), _as_int_array(count_miss))
+    is_classic = any(isinstance(m, ModClassic) for m in mods)
+    total_hits = summary.hit_object_count
+    if not is_classic:
+        total_hits += summary.hold_note_count
+
+    if count_meh is not None or count_ok is not None or count_good is not None or count_great is not None:
+        count_meh, count_ok, count_good, count_great = (np.broadcast_to(_optional_int_array(x), count_miss.shape) for x in (count_meh, count_ok, count_good, count_great))
+        count_perfect = total_hits - (count_miss + count_meh + count_ok + count_good + count_great)
+        return {
+            HitResult.Perfect: count_perfect,
+            HitResult.Great: count_great,
+            HitResult.Good: count_good,
+            HitResult.Ok: count_ok,
+            HitResult.Meh: count_meh,
+            HitResult.Miss: count_miss,
+        }
+
+    count_perfect, count_great, count_good, count_ok, count_meh = _fill_mania_hit_results_array(total_hits, is_classic, accuracy, count_miss)
+
+    return {
+        HitResult.Perfect: count_perfect,
+        HitResult.Great: count_great,
+        HitResult.Ok: count_ok,
+        HitResult.Good: count_good,
+        HitResult.Meh: count_meh,
+        HitResult.Miss: count_miss,
+    }
+
+
+def _fill_mania_hit_results_array(total_hits: int, is_classic: bool, accuracy: NDArray[np.float64], count_miss: NDArray[np.int64]) -> tuple[NDArray[np.int64], ...]:
+    perfect_value = 60 if is_classic else 61
+
+    target_total = _round(accuracy * total_hits * perfect_value)
+
+    remaining_hits = total_hits - count_miss
+    delta = np.maximum(target_total - (10 * remaining_hits), 0)
+
+    count_perfect = np.minimum(delta // (perfect_value - 10), remaining_hits)
+    delta = delta - count_perfect * (perfect_value - 10)
+    remaining_hits = remaining_hits - count_perfect
+
+    count_great = np.minimum(delta // 50, remaining_hits)
+    delta = delta - count_great * 50
+    remaining_hits = remaining_hits - count_great
+
+    count_good = np.minimum(delta // 30, remaining_hits)
+    delta = delta - count_good * 30
+    remaining_hits = remaining_hits - count_good
+
+    count_ok = np.minimum(delta // 10, remaining_hits)
+    remaining_hits = remaining_hits - count_ok
+
+    return count_perfect, count_great, count_good, count_ok, remaining_hits
+
+
+@lru_cache(maxsize=_MANIA_TABLE_CACHE_MAXSIZE)
+def _mania_table(total_hits: int, is_classic: bool, accuracy: tuple[float, ...], count_miss: tuple[int, ...]) -> tuple[NDArray[np.int64], ...]:
+    table = _fill_mania_hit_results_array(total_hits, is_classic, *np.broadcast_arrays(np.array(accuracy, dtype=np.float64)[np.newaxis, :], np.array(count_miss, dtype=np.int64)[:, np.newaxis]))
+    for column in table:
+        column.setflags(write=False)
+    return table
+
+
+def mania_hit_result_table(
+    beatmap: IBeatmap,
+    mods: Array[Mod],
+    accuracy: ArrayLike,
+    count_miss: ArrayLike = 0,
+    *,
+    summary: Optional[BeatmapSummary] = None,
+) -> dict[HitResult, NDArray[np.int64]]:
+    """预先生成 ``count_miss`` × ``accuracy`` 网格上的 mania hit result 分布，形状为 (len(count_miss), len(accuracy))
+
+    结果只由总物件数和 Classic 状态决定，因此物件数相同的谱面和模组组合共享同一张表（只读），
+    适合为大量谱面逐个准确率生成 pp 曲线
+    """
+    if summary is None:
+        summary = summarize_beatmap(beatmap, 3)
+    is_classic = any(isinstance(m, ModClassic) for m in mods)
+    total_hits = summary.hit_object_count
+    if not is_classic:
+        total_hits += summary.hold_note_count
+
+    accuracy = tuple(np.asarray(accuracy, dtype=np.float64).ravel().tolist())
+    count_miss = tuple(np.atleast_1d(_as_int_array(count_miss)).ravel().tolist())
+    count_perfect, count_great, count_good, count_ok, count_meh = _mania_table(total_hits, is_classic, accuracy, count_miss)
+    miss_table = np.broadcast_to(np.array(count_miss, dtype=np.int64)[:, np.newaxis], count_perfect.shape)
+    return {
+        HitResult.Perfect: count_perfect,
+        HitResult.Great: count_great,
+        HitResult.Ok: count_ok,
+        HitResult.Good: count_good,
+        HitResult.Meh: count_meh,
+        HitResult.Miss: miss_table,
+    }
+
+
+def get_mania_accuracy_array(beatmap: IBeatmap, statistics: dict[HitResult, NDArray[np.int64]], mods: Array[Mod], *, summary: Optional[BeatmapSummary] = None) -> NDArray[np.float64]:
+    count_perfect = statistics[HitResult.Perfect]
+    count_great = statistics[HitResult.Great]
+    count_good = statistics[HitResult.Good]
+    count_ok = statistics[HitResult.Ok]
+    count_meh = statistics[HitResult.Meh]
+    count_miss = statistics[HitResult.Miss]
+
+    is_classic = any(isinstance(m, ModClassic) for m in mods)
+    perfect_weight = 300 if is_classic else 305
+
+    total = (perfect_weight * count_perfect) + (300 * count_great) + (200 * count_good) + (100 * count_ok) + (50 * count_meh)
+    max_score = perfect_weight * (count_perfect + count_great + count_good + count_ok + count_meh + count_miss)
+
+    return _safe_divide(total, max_score)
+
+
+def _safe_divide(total: ArrayLike, max_score: ArrayLike) -> NDArray[np.float64]:
+    # 与标量版本一致，分母为 0 时准确率为 0.0
+    total, max_score = np.broadcast_arrays(np.asarray(total, dtype=np.float64), np.asarray(max_score, dtype=np.float64))
+    result = np.zeros(total.shape, dtype=np.float64)
+    np.divide(total, max_score, out=result, where=max_score != 0)
+    return result
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import pytest
+
+from osupp.core import init_osu_tools
+
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
+from osupp.aio import AsyncCalculator
+from osupp.difficulty import calculate_difficulty
+from osupp.performance import OsuPerformance, calculate_osu_performance
+
+
+def test_aio():
+    beatmap_path = "./3477131.osu"
+    perfs = [OsuPerformance(), OsuPerformance(accuracy_percent=95.0, misses=3)]
+    calculator = calculate_osu_performance(beatmap_path)
+    next(calculator)
+    expected_performances = calculator.send(perfs)
+    calculator.close()
+
+    async def main():
+        async with AsyncCalculator(max_pending=2) as aio:
+            first, second, (_, performances) = await asyncio.gather(
+                aio.calculate_difficulty(beatmap_path, ["HD"]),
+                aio.calculate_difficulty(beatmap_path, ["HD"]),
+                aio.calculate_performance(beatmap_path, perfs),
+            )
+            # 相同请求共享同一个结果
+            assert first is second
+            assert first == calculate_difficulty(beatmap_path, ["HD"])
+            assert performances == expected_performances
+            # 模组顺序不同的相同请求同样合并
+            hddt, dthd = await asyncio.gather(aio.calculate_difficulty(beatmap_path, ["HD", "DT"]), aio.calculate_difficulty(beatmap_path, ["DT", "HD"]))
+            assert hddt is dthd
+            with pytest.raises(TimeoutError):
+                await aio.calculate_difficulty(beatmap_path, ["DT"], timeout=0)
+            assert await aio.calculate_difficulty(beatmap_path, ["DT"]) == calculate_difficulty(beatmap_path, ["DT"])
+
+    asyncio.run(main())
+
+
+def test_aio_backpressure():
+    beatmap_path = "./3477131.osu"
+
+    async def main():
+        async with AsyncCalculator(max_pending=1) as aio:
+            requests = [asyncio.ensure_future(aio.calculate_difficulty(beatmap_path, mods)) for mods in ([], ["HD"], ["HR"], ["DT"])]
+            await asyncio.sleep(0)
+            # 名额用完后其余请求在创建任务之前等待
+            assert len(aio._in_flight) == 1
+            results = await asyncio.gather(*requests)
+            assert results[3] == calculate_difficulty(beatmap_path, ["DT"])
+            # 所有等待者都超时离开后任务的异常会被取出，不会产生未读取异常的警告
+            with pytest.raises(TimeoutError):
+                await aio.calculate_difficulty("./not_exists.osu", timeout=0)
+
+    asyncio.run(main())
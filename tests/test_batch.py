@@ -0,0 +1,79 @@
+import os
+
+from osupp.core import init_osu_tools
+
+BUILD_DIR = os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0")
+init_osu_tools(BUILD_DIR)
+from osupp.batch import BatchJob, run_batch, run_batch_threaded
+from osupp.config import set_config
+from osupp.difficulty import calculate_difficulty
+from osupp.performance import ExactPerformance, OsuPerformance, TaikoPerformance, calculate_osu_performance, calculate_taiko_performance
+
+
+def test_batch():
+    jobs = [
+        BatchJob("./3477131.osu", mods=["HD", "DT"]),
+        BatchJob("./4103079.osu"),
+        BatchJob("./3477131.osu", performances=[OsuPerformance(), OsuPerformance(combo=706, misses=2, mehs=4, oks=34)]),
+        BatchJob("./4434797.osu", performances=[TaikoPerformance(combo=272, oks=24, misses=2)]),
+        BatchJob("./not_exists.osu"),
+    ]
+    results = list(run_batch(BUILD_DIR, jobs, processes=2))
+    assert [result.job for result in results] == jobs
+
+    assert results[0].difficulty == calculate_difficulty("./3477131.osu", ["HD", "DT"])
+    assert results[1].difficulty == calculate_difficulty("./4103079.osu")
+
+    calculator = calculate_osu_performance("./3477131.osu")
+    assert results[2].difficulty == next(calculator)._get_pure()
+    assert results[2].performances == [calculator.send(perf) for perf in jobs[2].performances]
+    calculator.close()
+
+    calculator = calculate_taiko_performance("./4434797.osu")
+    assert results[3].difficulty == next(calculator)
+    assert results[3].performances == [calculator.send(perf) for perf in jobs[3].performances]
+    calculator.close()
+
+    # 单个任务失败不影响其他任务
+    assert results[4].error is not None
+    assert all(result.error is None for result in results[:4])
+
+    unordered = list(run_batch(BUILD_DIR, jobs, processes=2, chunksize=2, ordered=False))
+    assert sorted(map(repr, unordered)) == sorted(map(repr, results))
+
+
+def test_batch_threaded():
+    jobs = [BatchJob("./3477131.osu", mods=mods) for mods in ([], ["HD"], ["HR"], ["DT"], ["HD", "DT"], ["EZ"], ["HT"])]
+    jobs.append(BatchJob("./3477131.osu", performances=[OsuPerformance(), OsuPerformance(combo=706, misses=2, mehs=4, oks=34)]))
+    jobs.append(BatchJob("./not_exists.osu"))
+    results = list(run_batch_threaded(jobs, threads=4))
+    assert [result.job for result in results] == jobs
+    for result in results[:-2]:
+        assert result.difficulty == calculate_difficulty(result.job.beatmap_path, result.job.mods)
+    calculator = calculate_osu_performance("./3477131.osu")
+    next(calculator)
+    assert results[-2].performances == calculator.send(list(results[-2].job.performances))
+    calculator.close()
+    assert results[-1].error is not None
+    assert sorted(result.job.mods or [] for result in run_batch_threaded(jobs[:-2], threads=4, ordered=False)) == sorted(job.mods for job in jobs[:-2])
+    # 生成器输入按窗口逐个提交，结果不变
+    assert list(run_batch_threaded(iter(jobs), threads=2, max_pending=3)) == results
+
+
+def test_batch_ruleset_fallback():
+    jobs = [
+        BatchJob("./4434797.osu", performances=[ExactPerformance.from_statistics({"great": 552, "ok": 24, "miss": 2}, 272)]),
+        BatchJob("./4434797.osu", performances=[]),
+    ]
+    # 无法 pickle 的 metrics_hook 不会传给 worker
+    set_config(metrics_hook=lambda metrics: None)
+    try:
+        results = list(run_batch(BUILD_DIR, jobs, processes=1, timeout=60))
+    finally:
+        set_config(metrics_hook=None)
+    assert all(result.error is None for result in results)
+    calculator = calculate_taiko_performance("./4434797.osu")
+    next(calculator)
+    assert results[0].performances == [calculator.send(TaikoPerformance(combo=272, oks=24, misses=2))]
+    calculator.close()
+    assert results[1].performances == []
@@ -1,12 +1,24 @@
+import os
+
 import orjson
 
-from osupp.core import init_osu_tools
+from osupp.core import init_osu_tools, startup_report, warm_up
 
-init_osu_tools(r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0")
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
 from osupp import set_config
-from osupp.difficulty import calculate_difficulty
-from osupp.performance import CatchPerformance, ManiaPerformance, OsuPerformance, TaikoPerformance, calculate_catch_performance, calculate_mania_performance, calculate_osu_performance, calculate_taiko_performance
-from osupp.util import Result
+from osupp.batch import BatchJob, run_batch_threaded
+from osupp.cache import beatmap_cache_info, clear_beatmap_cache, get_working_beatmap
+from osupp.registry import canonical_mods, get_ruleset, mod_set_key, parse_mods
+from osupp.solver import PerformanceSolver
+from osupp.store import get_difficulty_store
+from osupp.difficulty import calculate_difficulty, calculate_difficulty_many
+from osupp.gradual import calculate_gradual
+from osupp.instrument import collect_metrics, start_call
+from osupp.ingest import ScoreRecord, legacy_mods_to_acronyms, read_json_lines, recalculate
+from osupp.limits import scan_beatmap
+from osupp.performance import CatchPerformance, ExactPerformance, ManiaPerformance, OsuPerformance, ScoreCalculator, TaikoPerformance, calculate_catch_performance, calculate_mania_performance, calculate_osu_performance, calculate_taiko_performance, hit_result_from_name, summarize_beatmap
+from osupp.pipeline import get_playable_beatmap
+from osupp.util import CompactResult, Result, ResultColumns, compact
 
 # 准备测试结果
 DIFF_RESULT = '{"star_rating":8.340159453660592,"max_combo":1782,"aim_difficulty":4.464371148872465,"aim_difficult_slider_count":229.3534837920631,"speed_difficulty":3.5505915358962152,"speed_note_count":322.6236688454787,"slider_factor":0.9672502717561137,"aim_top_weighted_slider_factor":0.455429594945989,"speed_top_weighted_slider_factor":0.4901857094088748,"aim_difficult_strain_count":155.50956192853607,"speed_difficult_strain_count":91.93918738759285,"nested_score_per_object":27.145174371451745,"legacy_score_base_multiplier":4.0,"maximum_legacy_combo_score":52235232.0}'.encode()
@@ -258,3 +270,297 @@ def test_mania_cl_perf():
     calculator = calculate_mania_performance(beatmap_path, mods=["CL"])
     next(calculator)
     assert calculator.send(ManiaPerformance(oks=20, mehs=5, goods=190, misses=10, greats=1199)) == orjson.loads(MANIA_CL_SCORE_RESULT)["performance_attributes"]
+
+
+def test_exact_perf():
+    for beatmap_path, fixture, calculate in [
+        ("./4434797.osu", TAIKO_SCORE_RESULT, calculate_taiko_performance),
+        ("./4364723.osu", MANIA_SCORE_RESULT, calculate_mania_performance),
+        ("./767046.osu", MANIA_CL_SCORE_RESULT, calculate_mania_performance),
+    ]:
+        score = orjson.loads(fixture)["score"]
+        calculator = calculate(beatmap_path, mods=[mod["acronym"] for mod in score["mods"]])
+        next(calculator)
+        assert calculator.send(ExactPerformance.from_statistics(score["statistics"], score["combo"])) == orjson.loads(fixture)["performance_attributes"]
+    calculator = calculate_catch_performance("./2158794.osu", mods=["NF", "CL"])
+    next(calculator)
+    assert calculator.send(ExactPerformance.from_statistics(orjson.loads(CATCH_SCORE_RESULT)["score"]["statistics"], 226)) == orjson.loads(CATCH_SCORE_RESULT)["performance_attributes"]
+
+
+def test_exact_accuracy():
+    def exact_accuracy(beatmap_path, ruleset_id, mods, statistics):
+        ruleset = get_ruleset(ruleset_id)
+        working_beatmap = get_working_beatmap(beatmap_path)
+        mod_array = parse_mods(ruleset_id, mods)
+        summary = summarize_beatmap(get_playable_beatmap(working_beatmap, ruleset, mod_array), ruleset_id)
+        score_calculator = ScoreCalculator(ruleset, working_beatmap.BeatmapInfo, mod_array)
+        return score_calculator.exact_accuracy({hit_result_from_name(k): v for k, v in statistics.items()}, summary), summary
+
+    # large_tick_miss 计入接水果的总数
+    statistics = {"great": 335, "large_tick_hit": 26, "large_tick_miss": 2, "small_tick_hit": 162, "small_tick_miss": 6, "miss": 7}
+    assert exact_accuracy("./2158794.osu", 2, ["NF", "CL"], statistics)[0] == 523 / 538
+    # stable 成绩没有滑条判定，只按圆圈判定计算
+    assert exact_accuracy("./3477131.osu", 0, [], {"great": 1200, "ok": 30, "meh": 2, "miss": 1})[0] == (6 * 1200 + 2 * 30 + 2) / (6 * 1233)
+    accuracy, summary = exact_accuracy("./3477131.osu", 0, [], {"great": 1200, "ok": 30, "meh": 2, "miss": 1, "slider_tail_hit": 10, "large_tick_miss": 3})
+    assert accuracy == (6 * 1200 + 2 * 30 + 2 + 3 * 10 + 0.6 * (summary.large_tick_count - 3)) / (6 * 1233 + 3 * summary.slider_count + 0.6 * summary.large_tick_count)
+
+
+def test_beatmap_cache():
+    clear_beatmap_cache()
+    beatmap_path = "./3477131.osu"
+    first = calculate_difficulty(beatmap_path, ["HD", "DT"])
+    second = calculate_difficulty(beatmap_path, ["HD", "DT"])
+    calculator = calculate_osu_performance(beatmap_path, ["HD", "DT"])
+    third = next(calculator)
+    calculator.close()
+    assert first == second == third._get_pure()
+    info = beatmap_cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+    assert info.currsize == 1
+
+
+def test_difficulty_store(tmp_path):
+    set_config(difficulty_store=str(tmp_path / "difficulty.sqlite3"))
+    try:
+        beatmap_path = "./3477131.osu"
+        mods = ["HD", "DT"]
+        assert orjson.dumps(calculate_difficulty(beatmap_path, mods, ["DT_speed_change=1.3", "DT_adjust_pitch=true"])) == DIFF_RESULT
+        # 写法不同但规范化后相同的模组设置应当直接命中
+        store = get_difficulty_store()
+        count = store._conn.execute("SELECT COUNT(*) FROM difficulty_attributes").fetchone()[0]
+        assert orjson.dumps(calculate_difficulty(beatmap_path, mods, ["DT_adjust_pitch=1", "DT_speed_change=1.3"])) == DIFF_RESULT
+        assert store._conn.execute("SELECT COUNT(*) FROM difficulty_attributes").fetchone()[0] == count == 1
+        # 全部命中时只读取文件头部的模式，不解析谱面
+        clear_beatmap_cache()
+        assert orjson.dumps(calculate_difficulty(beatmap_path, mods, ["DT_speed_change=1.3", "DT_adjust_pitch=true"])) == DIFF_RESULT
+        assert beatmap_cache_info().misses == 0
+        assert scan_beatmap(beatmap_path).ruleset_id == 0 and scan_beatmap("./4434797.osu").ruleset_id == 1
+    finally:
+        set_config(difficulty_store=None)
+
+
+def test_difficulty_many():
+    beatmap_path = "./3477131.osu"
+    mod_sets = [[], ["HD"], ["HR"], ["DT"], ["HD", "DT"], ["EZ"], ["HT"]]
+    results = calculate_difficulty_many(beatmap_path, mod_sets)
+    assert results == [calculate_difficulty(beatmap_path, mods) for mods in mod_sets]
+    results = calculate_difficulty_many(beatmap_path, [["HD", "DT"]], [["DT_speed_change=1.3"]])
+    assert orjson.dumps(results[0]) == DIFF_RESULT
+    legacy_results = calculate_difficulty_many(beatmap_path)
+    nomod = next(result for result in legacy_results if result["__ek_mods"] in ([], ["NM"]))
+    assert nomod._get_pure() == calculate_difficulty(beatmap_path)
+
+
+def test_performance_many():
+    beatmap_path = "./3477131.osu"
+    perfs = [OsuPerformance(), OsuPerformance(combo=706, misses=2, mehs=4, oks=34, large_tick_misses=0, slider_tail_misses=7), OsuPerformance(accuracy_percent=95.0, misses=3)]
+    calculator = calculate_osu_performance(beatmap_path)
+    next(calculator)
+    singles = [calculator.send(perf) for perf in perfs]
+    assert calculator.send(perfs) == singles
+    assert singles[1] == Result(orjson.loads(PERF_RESULT))["performance_attributes"]
+    calculator.close()
+
+
+def test_fast_deserialize():
+    beatmap_path = "./3477131.osu"
+    outputs = []
+    for fast_deserialize in (False, True):
+        set_config(fast_deserialize=fast_deserialize, strain_timeline=False)
+        calculator = calculate_osu_performance(beatmap_path, ["HD", "DT", "FL"])
+        diff_attr = next(calculator)
+        perf_attrs = calculator.send([OsuPerformance(), OsuPerformance(combo=706, misses=2, mehs=4, oks=34)])
+        calculator.close()
+        outputs.append(orjson.dumps([calculate_difficulty("./4434797.osu"), diff_attr, *perf_attrs]))
+    set_config(fast_deserialize=True)
+    assert outputs[0] == outputs[1]
+
+
+def test_compact_result():
+    import pickle
+
+    results = [calculate_difficulty("./3477131.osu", mods) for mods in ([], ["HD"], ["HR"], ["DT"])]
+    compacts = [compact(result) for result in results]
+    assert len({c._keys for c in compacts}) == 1
+    for result, c in zip(results, compacts):
+        assert c["star_rating"] == result["star_rating"]
+        assert c["key_not_exists"] == 0.0
+        assert c._get_pure() == result._get_pure()
+        assert pickle.loads(pickle.dumps(c)).to_result() == result
+        # 按映射比较和迭代
+        assert c == result and list(c) == list(result) and dict(c) == result
+        assert not isinstance(c, tuple) and c != tuple(result.values())
+        # JSON 序列化需要先转换为 dict，结果与原始结果相同
+        assert orjson.loads(orjson.dumps(c, default=CompactResult.to_dict)) == orjson.loads(orjson.dumps(result))
+        assert orjson.loads(orjson.dumps(c.to_dict())) == result
+    assert compacts[0] != compact(Result(zip(["other_" + k for k in results[0]], results[0].values())))
+    columns = ResultColumns.from_results(compacts).to_numpy()
+    assert columns["star_rating"].tolist() == [result["star_rating"] for result in results]
+    assert columns["max_combo"].dtype.kind == "i"
+
+
+def test_strain_timeline_format():
+    beatmap_path = "./3477131.osu"
+    timelines = []
+    for as_tuples in (False, True):
+        set_config(strain_timeline=True, strain_timeline_as_tuples=as_tuples)
+        calculator = calculate_osu_performance(beatmap_path)
+        diff_attr = next(calculator)
+        calculator.close()
+        timelines.append((diff_attr["__ek_aim_strain_timeline"], diff_attr["__ek_speed_strain_timeline"]))
+    set_config(strain_timeline_as_tuples=False)
+    for arrays, tuples in zip(*timelines):
+        assert arrays.time.dtype == arrays.strain.dtype == "float64"
+        assert list(zip(arrays.time.tolist(), arrays.strain.tolist())) == tuples
+
+
+def test_strain_timeline_more_rulesets():
+    set_config(strain_timeline=True)
+    for calculate_performance, beatmap_path, perf in (
+        (calculate_taiko_performance, "./4434797.osu", TaikoPerformance(combo=272, oks=24, misses=2)),
+        (calculate_catch_performance, "./2158794.osu", CatchPerformance(accuracy_percent=97.5, misses=7)),
+        (calculate_mania_performance, "./4364723.osu", ManiaPerformance(accuracy_percent=98.0, misses=1)),
+    ):
+        for mods in ([], ["DT"]):
+            calculator = calculate_performance(beatmap_path, mods)
+            expected_diff = next(calculator)
+            expected_perf = calculator.send(perf)
+            calculator.close()
+            assert not any(key.endswith("_strain_timeline") for key in expected_diff)
+            calculator = calculate_performance(beatmap_path, mods, strain_timeline=True)
+            diff_attr = next(calculator)
+            # 反射复现的难度计算与 Calculate 的结果完全相同
+            assert diff_attr._get_pure() == expected_diff == calculate_difficulty(beatmap_path, mods)
+            assert calculator.send(perf) == expected_perf
+            calculator.close()
+            timelines = [value for key, value in diff_attr.items() if key.endswith("_strain_timeline")]
+            assert timelines
+            for timeline in timelines:
+                assert len(timeline.time) == len(timeline.strain) > 0
+                assert (timeline.time[1:] > timeline.time[:-1]).all()
+
+
+def test_solver():
+    beatmap_path = "./3477131.osu"
+    calculator = calculate_osu_performance(beatmap_path)
+    summary = summarize_beatmap(get_playable_beatmap(get_working_beatmap(beatmap_path), get_ruleset(0), parse_mods(0)), 0)
+    solver = PerformanceSolver(calculator, next(calculator), summary)
+    result = solver.solve_accuracy(400.0, OsuPerformance(misses=1))
+    assert result.reachable and result.performance_attributes["pp"] >= 400.0
+    # 下限从 1/6 开始，不会返回 pp 估计失真的低准确率
+    assert 100.0 / 6 < result.performance.accuracy_percent < 100.0
+    assert result.evaluations <= 34
+    assert solver.evaluate(result.performance._replace(accuracy_percent=result.performance.accuracy_percent - 0.01))["pp"] < 400.0
+    assert not solver.solve_accuracy(MAX_PP + 1, OsuPerformance()).reachable
+    result = solver.solve_misses(300.0, OsuPerformance(accuracy_percent=98.0))
+    assert result.performance_attributes["pp"] >= 300.0
+    assert solver.evaluate(result.performance._replace(misses=result.performance.misses + 1))["pp"] < 300.0
+    # miss 数的上限是物件数而不是 max_combo，不会搜索到 300 数量为负的成绩
+    result = solver.solve_misses(0.0, OsuPerformance(accuracy_percent=98.0))
+    assert result.performance.misses <= summary.hit_object_count < solver.difficulty_attributes["max_combo"]
+    calculator.close()
+
+
+def test_limits_and_timeout():
+    from osupp.core import CancellationTokenSource
+
+    beatmap_path = "./3477131.osu"
+    scan = scan_beatmap(beatmap_path)
+    set_config(max_hit_objects=scan.hit_object_count - 1)
+    assert calculate_difficulty(beatmap_path)["__ek_rejected"]
+    # 所有 legacy 组合的计算同样带有拒绝标记，而不是空列表
+    assert [bool(result["__ek_rejected"]) for result in calculate_difficulty_many(beatmap_path)] == [True]
+    calculator = calculate_osu_performance(beatmap_path)
+    assert next(calculator)["__ek_rejected"]
+    assert all(result["__ek_rejected"] for result in calculator.send([OsuPerformance(), OsuPerformance(misses=1)]))
+    calculator.close()
+    set_config(max_hit_objects=scan.hit_object_count, max_slider_length=scan.max_slider_length)
+    assert "__ek_rejected" not in calculate_difficulty(beatmap_path)
+    set_config(max_hit_objects=None, max_slider_length=None)
+
+    token_source = CancellationTokenSource()
+    token_source.Cancel()
+    assert calculate_difficulty(beatmap_path, cancellation_token=token_source.Token, timeout=60)["__ek_cancelled"]
+    assert [result["__ek_cancelled"] for result in calculate_difficulty_many(beatmap_path, cancellation_token=token_source.Token)] == [True]
+    calculator = calculate_osu_performance(beatmap_path, timeout=1e-6)
+    assert next(calculator)["__ek_cancelled"]
+    calculator.close()
+
+
+def test_startup():
+    warm_up(["osu", "taiko"])
+    assert {"runtime", "assemblies", "ruleset:osu", "ruleset:taiko", "warm_up:osu", "warm_up:taiko"} <= startup_report().keys()
+
+
+def test_registry():
+    assert get_ruleset(0) is get_ruleset(0)
+    assert get_ruleset(3).RulesetInfo.OnlineID == 3
+    assert mod_set_key(0, ["HD", "DT"]) == mod_set_key(0, ["DT", "HD"])
+    assert parse_mods(0, ["HD", "DT"]) is parse_mods(0, ["DT", "HD"])
+    assert canonical_mods(0, ["DT"], ["DT_adjust_pitch=true"]) == canonical_mods(0, ["DT"], ["DT_adjust_pitch=1"])
+    assert canonical_mods(0, ["DT"]) != canonical_mods(0, ["DT"], ["DT_speed_change=1.3"])
+    # 计算使用缓存模组的副本，RD 写入的随机种子不会留在缓存中
+    calculator = calculate_osu_performance("./3477131.osu", ["RD"])
+    next(calculator)
+    calculator.close()
+    assert parse_mods(0, ["RD"])[0].Seed.Value is None
+
+
+def test_ingest():
+    paths = {4434797: "./4434797.osu", 2158794: "./2158794.osu", 4364723: "./4364723.osu", 767046: "./767046.osu"}
+    fixtures = [TAIKO_SCORE_RESULT, CATCH_SCORE_RESULT, MANIA_SCORE_RESULT, MANIA_CL_SCORE_RESULT]
+    lines = [orjson.dumps(orjson.loads(fixture)) for fixture in fixtures] + [b'{"ruleset_id":0,"beatmap_id":1,"mods":[],"statistics":{}}']
+    results = list(recalculate(read_json_lines(lines), lambda record: paths.get(record.beatmap_id)))
+    assert results[0].error == "beatmap not found"
+    for result, fixture in zip(results[1:], fixtures):
+        assert result.error is None
+        assert result.performance == orjson.loads(fixture)["performance_attributes"]
+    assert legacy_mods_to_acronyms(576 | 16) == ["HR", "NC"]
+
+    # 模组顺序不同的成绩归入同一组，只计算一次难度
+    records = [ScoreRecord(0, {"great": 600, "ok": 10, "miss": 1}, ["HD", "DT"], [], combo=500), ScoreRecord(0, {"great": 600, "ok": 10, "miss": 1}, ["DT", "HD"], [], combo=500)]
+    with collect_metrics() as calls:
+        results = list(recalculate(records, lambda record: "./3477131.osu"))
+    assert len(calls) == 1
+    assert results[0].performance == results[1].performance and results[0].error is None
+
+
+def test_metrics():
+    hooked = []
+    with collect_metrics() as calls:
+        calculate_difficulty("./3477131.osu")
+        calculator = calculate_osu_performance("./3477131.osu")
+        next(calculator)
+        calculator.send([OsuPerformance(), OsuPerformance(misses=1)])
+        calculator.close()
+    set_config(metrics_hook=hooked.append)
+    try:
+        calculate_difficulty("./4434797.osu", ruleset_id=1)
+    finally:
+        set_config(metrics_hook=None)
+    assert [call.name for call in calls] == ["calculate_difficulty", "calculate_performance"]
+    assert {"difficulty", "serialize"} <= calls[0].stages.keys()
+    assert {"parse", "difficulty", "playable_beatmap", "performance"} <= calls[1].stages.keys()
+    assert calls[1].counts["scores"] == 2 and calls[1].counts["hit_objects"] > 0
+    assert len(hooked) == 1 and hooked[0].entries["difficulty"] == 1
+    # 跨 .NET 边界的调用次数：难度计算和序列化各一次，每个成绩一次 Calculate 加一次批量序列化，每个谱面物件遍历一次
+    assert calls[0].interop_calls == {"difficulty": 1, "serialize": 1}
+    assert calls[1].interop_calls["performance"] == 3 and calls[1].interop_calls["playable_beatmap"] == 1
+    assert calls[1].interop_calls["summarize"] == calls[1].counts["hit_objects"] + 1 == 1234
+    # 渐进计算和线程批量计算同样统计，线程中的调用会收集到当前线程
+    with collect_metrics() as calls:
+        gradual = calculate_gradual("./4434797.osu", object_counts=[100, 200])
+        next(gradual)
+        gradual.send(TaikoPerformance())
+        gradual.close()
+        list(run_batch_threaded([BatchJob("./4434797.osu"), BatchJob("./not_exists.osu")], threads=2))
+    assert calls[0].name == "calculate_gradual"
+    assert calls[0].counts["points"] == 1 and calls[0].counts["scores"] == 1 and calls[0].counts["difficulty_objects"] > 0
+    assert calls[0].interop_calls["difficulty_objects"] == 3 + calls[0].counts["difficulty_objects"]
+    assert calls[0].interop_calls["progressive_beatmap"] == 2 * calls[0].counts["hit_objects"] and calls[0].counts["hit_objects"] >= 100
+    assert calls[0].interop_calls["process"] > 0 and calls[0].interop_calls["performance"] == 2
+    batch_calls = [call for call in calls if call.name == "batch_job"]
+    assert len(batch_calls) == 2 and sum(call.counts.get("errors", 0) for call in batch_calls) == 1
+    # 未启用时不统计
+    assert start_call("calculate_difficulty", "./3477131.osu") is None
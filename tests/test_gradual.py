@@ -0,0 +1,53 @@
+import os
+
+from osupp.core import init_osu_tools
+
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
+from osupp import set_config
+from osupp.core import CancellationTokenSource
+from osupp.difficulty import calculate_difficulty
+from osupp.gradual import calculate_gradual
+from osupp.performance import OsuPerformance, TaikoPerformance, calculate_osu_performance, calculate_taiko_performance
+
+
+def test_gradual_full_map():
+    set_config(strain_timeline=False)
+    for beatmap_path, calculate_performance, perf in (
+        ("./3477131.osu", calculate_osu_performance, OsuPerformance(combo=706, misses=2, mehs=4, oks=34, large_tick_misses=0, slider_tail_misses=7)),
+        ("./4434797.osu", calculate_taiko_performance, TaikoPerformance(combo=272, oks=24, misses=2)),
+    ):
+        calculator = calculate_performance(beatmap_path)
+        next(calculator)
+        expected = calculator.send(perf)
+        calculator.close()
+
+        gradual = calculate_gradual(beatmap_path, object_counts=[10**9])
+        point = next(gradual)
+        assert point.difficulty_attributes == calculate_difficulty(beatmap_path)
+        assert gradual.send(perf) == expected
+        gradual.close()
+
+
+def test_gradual_points():
+    beatmap_path = "./3477131.osu"
+    points = list(calculate_gradual(beatmap_path, object_counts=[100, 200, 300]))
+    assert [point.object_count for point in points] == [100, 200, 300]
+    assert points[0].difficulty_attributes["max_combo"] < points[1].difficulty_attributes["max_combo"] < points[2].difficulty_attributes["max_combo"]
+    # 每个难度物件都返回一次
+    timed = list(calculate_gradual(beatmap_path))
+    assert timed[99].object_count == 101
+    times = [point.time for point in timed]
+    assert times == sorted(times)
+    assert [point.time for point in calculate_gradual(beatmap_path, times=[times[9], times[19] + 0.5])] == [times[9], times[19]]
+
+    calculator = calculate_gradual(beatmap_path, object_counts=[100])
+    next(calculator)
+    first, second = calculator.send([OsuPerformance(misses=0), OsuPerformance(misses=1)])
+    assert first["pp"] > second["pp"]
+
+
+def test_gradual_cancelled():
+    token_source = CancellationTokenSource()
+    token_source.Cancel()
+    points = list(calculate_gradual("./3477131.osu", object_counts=[100, 200], cancellation_token=token_source.Token))
+    assert len(points) == 1 and points[0].difficulty_attributes["__ek_cancelled"]
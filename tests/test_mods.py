@@ -1,9 +1,11 @@
+import os
+
 import orjson
 
 from osupp.core import init_osu_tools
 
-init_osu_tools(r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0")
-from osupp.difficulty import get_all_mods
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
+from osupp.difficulty import export_all_mods, get_all_mods
 from osupp.core import OsuRuleset, CatchRuleset, ManiaRuleset, TaikoRuleset
 
 
@@ -47,3 +49,21 @@ def test():
                 osu_mod_setting_name = osu_mod_setting["Name"]
                 osu_mod_setting_type = osu_mod_setting["Type"]
                 assert type_mapping[mod_setting_type_d[osu_mod_acronym][osu_mod_setting_name]] == osu_mod_setting_type
+
+
+def test_export(tmp_path):
+    assert get_all_mods(OsuRuleset()) is get_all_mods(OsuRuleset())
+    path = tmp_path / "osu_mods.json"
+    exported = export_all_mods(str(path))
+    with open(path, "rb") as fi_b:
+        assert orjson.loads(fi_b.read()) == exported
+    with open("osu_mods.json", "rb") as fi_b:
+        osu_mods_net = orjson.loads(fi_b.read())
+    assert [(ruleset["Name"], ruleset["RulesetID"]) for ruleset in exported] == [(ruleset["Name"], ruleset["RulesetID"]) for ruleset in osu_mods_net]
+    for ruleset, ruleset_net in zip(exported, osu_mods_net):
+        assert ruleset["Mods"][0].keys() == ruleset_net["Mods"][0].keys()
+        mods_net = {mod["Acronym"]: mod for mod in ruleset_net["Mods"]}
+        for mod in ruleset["Mods"]:
+            if mod["Acronym"] in mods_net:
+                assert mod["Settings"] == mods_net[mod["Acronym"]]["Settings"]
+                assert sorted(mod["IncompatibleMods"]) == sorted(mods_net[mod["Acronym"]]["IncompatibleMods"])
@@ -0,0 +1,16 @@
+import sys
+
+from osupp.mods import load_all_mods, mod_setting_types, validate_mods
+
+
+def test_offline():
+    all_mods = load_all_mods("osu_mods.json")
+    setting_types = mod_setting_types(all_mods, 0)
+    assert setting_types["DT"]["speed_change"] is float
+    assert setting_types["DT"]["adjust_pitch"] is bool
+    assert validate_mods(all_mods, 0, ["HD", "DT"], ["DT_speed_change=1.3", "DT_adjust_pitch=true"]) == []
+    assert len(validate_mods(all_mods, 0, ["XX", "DT"], ["DT_speed_change=fast", "HR_unknown=1", "DT_nothing=1"])) == 4
+    assert len(validate_mods(all_mods, 3, ["4K"], [])) == 0
+    if "osupp.core" not in sys.modules:
+        # 单独运行时确认没有加载 .NET 运行时
+        assert "pythonnet" not in sys.modules
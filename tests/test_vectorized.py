@@ -0,0 +1,114 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from osupp.core import init_osu_tools
+
+init_osu_tools(os.environ.get("OSUPP_BUILD_DIR", r"C:\Users\bobbycyl\Projects\osu-tools\PerformanceCalculator\bin\Release\net8.0"))
+from osupp.core import Array, CatchRuleset, ManiaRuleset, OsuRuleset, ProcessorCommand, ProcessorWorkingBeatmap, TaikoRuleset
+from osupp.performance import (
+    generate_catch_hit_results,
+    generate_mania_hit_results,
+    generate_osu_hit_results,
+    generate_taiko_hit_results,
+    get_catch_accuracy,
+    get_mania_accuracy,
+    get_osu_accuracy,
+    get_taiko_accuracy,
+    summarize_beatmap,
+)
+from osupp.vectorized import (
+    generate_catch_hit_results_array,
+    generate_mania_hit_results_array,
+    generate_osu_hit_results_array,
+    generate_taiko_hit_results_array,
+    get_catch_accuracy_array,
+    get_mania_accuracy_array,
+    get_osu_accuracy_array,
+    get_taiko_accuracy_array,
+    mania_hit_result_table,
+)
+
+ACCURACIES = np.round(np.arange(0.0, 1.00005, 0.0001), 4)
+MISSES = np.array([0, 1, 2, 5, 20])
+
+
+def prepare(beatmap_path, ruleset, mods=None):
+    mod_array = ProcessorCommand.ParseMods(ruleset, Array[str](mods or []), Array[str]([]))
+    beatmap = ProcessorWorkingBeatmap(beatmap_path).GetPlayableBeatmap(ruleset.RulesetInfo, mod_array)
+    # 谱面物件统计只做一次，标量和数组版本共用，避免每个网格点都重新遍历物件
+    return beatmap, mod_array, summarize_beatmap(beatmap, ruleset.RulesetInfo.OnlineID)
+
+
+def assert_same(scalar_generate, scalar_accuracy, array_generate, array_accuracy, beatmap, mod_array, summary):
+    accuracy, misses = np.meshgrid(ACCURACIES, MISSES)
+    statistics = array_generate(accuracy, misses)
+    accuracies = array_accuracy(beatmap, statistics, mod_array, summary=summary)
+    for index in np.ndindex(accuracy.shape):
+        expected = scalar_generate(float(accuracy[index]), int(misses[index]))
+        assert {k: int(v[index]) for k, v in statistics.items()} == expected
+        assert accuracies[index] == scalar_accuracy(beatmap, expected, mod_array, summary=summary)
+
+
+def test_osu():
+    beatmap, mod_array, summary = prepare("./3477131.osu", OsuRuleset())
+    assert_same(
+        lambda a, m: generate_osu_hit_results(beatmap, a, m, None, None, 0, 0, summary=summary),
+        get_osu_accuracy,
+        lambda a, m: generate_osu_hit_results_array(beatmap, a, m, None, None, 0, 0, summary=summary),
+        get_osu_accuracy_array,
+        beatmap,
+        mod_array,
+        summary,
+    )
+
+
+def test_taiko():
+    beatmap, mod_array, summary = prepare("./4434797.osu", TaikoRuleset())
+    assert_same(
+        lambda a, m: generate_taiko_hit_results(beatmap, a, m, summary=summary),
+        get_taiko_accuracy,
+        lambda a, m: generate_taiko_hit_results_array(beatmap, a, m, summary=summary),
+        get_taiko_accuracy_array,
+        beatmap,
+        mod_array,
+        summary,
+    )
+
+
+def test_catch():
+    beatmap, mod_array, summary = prepare("./2158794.osu", CatchRuleset(), ["NF", "CL"])
+    assert_same(
+        lambda a, m: generate_catch_hit_results(beatmap, a, m, summary=summary),
+        get_catch_accuracy,
+        lambda a, m: generate_catch_hit_results_array(beatmap, a, m, summary=summary),
+        get_catch_accuracy_array,
+        beatmap,
+        mod_array,
+        summary,
+    )
+
+
+def test_mania():
+    for mods in ([], ["CL"]):
+        beatmap, mod_array, summary = prepare("./767046.osu", ManiaRuleset(), mods)
+        assert_same(
+            partial(generate_mania_hit_results, beatmap, mod_array, summary=summary),
+            get_mania_accuracy,
+            partial(generate_mania_hit_results_array, beatmap, mod_array, summary=summary),
+            get_mania_accuracy_array,
+            beatmap,
+            mod_array,
+            summary,
+        )
+
+
+def test_mania_table():
+    for mods in ([], ["CL"]):
+        beatmap, mod_array, summary = prepare("./767046.osu", ManiaRuleset(), mods)
+        accuracy, misses = np.meshgrid(ACCURACIES, MISSES)
+        expected = generate_mania_hit_results_array(beatmap, mod_array, accuracy, misses, summary=summary)
+        table = mania_hit_result_table(beatmap, mod_array, ACCURACIES, MISSES, summary=summary)
+        assert all(np.array_equal(table[k], v) for k, v in expected.items())
+        assert mania_hit_result_table(beatmap, mod_array, ACCURACIES, MISSES, summary=summary)[next(iter(table))] is table[next(iter(table))]